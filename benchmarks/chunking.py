@@ -0,0 +1,68 @@
+"""Throughput of the token-budgeted chunker against `recursive_chunking`.
+
+Chunks the text of the saved HTML corpus with both chunkers and reports
+MB/s, chunk counts and how many chunks overflow the model's token window
+(and would be silently truncated by the embedding model).
+
+    python benchmarks/chunking.py --repeat 20 --max-tokens 510
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(project_root)
+
+from transformers import AutoTokenizer
+
+from utils.chunking import recursive_chunking, token_chunking
+from utils.embed_model import VI_EMDED_MODEL
+from utils.html_extract import extract_main_content
+from utils.text_preprocessing import process_text
+
+CORPUS_DIR = os.path.join(current_dir, "data", "html")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus_dir", nargs="?", default=CORPUS_DIR)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--max-tokens", type=int, default=510)
+    parser.add_argument("--model", default=VI_EMDED_MODEL)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    texts = []
+    for path in sorted(glob.glob(os.path.join(args.corpus_dir, "*.html"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            texts.append(extract_main_content(f.read())[1])
+    # Long documents are where the two chunkers differ
+    document = "\n".join(texts * 10)
+    size_mb = len(document.encode()) / 1e6
+
+    chunkers = {
+        "recursive_chunking": lambda: recursive_chunking(
+            process_text(document), int(args.max_tokens * 0.8), 10
+        ),
+        "token_chunking": lambda: token_chunking(document, tokenizer, args.max_tokens),
+    }
+    for name, chunk in chunkers.items():
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            chunks = chunk()
+        seconds = (time.perf_counter() - t0) / args.repeat
+        encoded = tokenizer(chunks, add_special_tokens=False, verbose=False)
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+        overflowing = sum(length > args.max_tokens for length in lengths)
+        print(
+            f"{name:>18}: {size_mb / seconds:6.2f} MB/s, {len(chunks)} chunks, "
+            f"max {max(lengths)} tokens, {overflowing} over {args.max_tokens}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Throughput and accuracy of the embedding inference backends.
+
+Embeds sentences taken from the saved HTML corpus with the fp32 torch model
+and with every other backend, reporting sentences/s and the cosine agreement
+of each backend's vectors with the fp32 ones.
+
+    python benchmarks/embed_backends.py --backends int8 onnx --threads 4
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(project_root)
+
+from utils.chunking import SENTENCE_BOUNDARY
+from utils.embed_model import VI_EMDED_MODEL, EmbedModel, cosine_agreement
+from utils.html_extract import extract_main_content
+
+CORPUS_DIR = os.path.join(current_dir, "data", "html")
+
+
+def load_sentences(corpus_dir: str, limit: int) -> list[str]:
+    sentences = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, "*.html"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            content = extract_main_content(f.read())[1]
+        sentences.extend(s.strip() for s in SENTENCE_BOUNDARY.split(content))
+    return [s for s in sentences if len(s) > 20][:limit]
+
+
+def throughput(model: EmbedModel, sentences: list[str], batch_size: int) -> float:
+    model.encode(sentences[:batch_size], batch_size=batch_size)  # warm up
+    t0 = time.perf_counter()
+    model.encode(sentences, batch_size=batch_size)
+    return len(sentences) / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus_dir", nargs="?", default=CORPUS_DIR)
+    parser.add_argument("--model", default=VI_EMDED_MODEL)
+    parser.add_argument("--backends", nargs="+", default=["int8", "onnx"])
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--sentences", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    sentences = load_sentences(args.corpus_dir, args.sentences)
+    reference = EmbedModel(args.model, backend="torch", threads=args.threads)
+    base = throughput(reference, sentences, args.batch_size)
+    print(f"{'torch':>6}: {base:8.1f} sentences/s")
+    for backend in args.backends:
+        model = EmbedModel(args.model, backend=backend, threads=args.threads)
+        speed = throughput(model, sentences, args.batch_size)
+        agreement = cosine_agreement(model, reference, sentences, args.batch_size)
+        print(
+            f"{backend:>6}: {speed:8.1f} sentences/s ({speed / base:.2f}x), "
+            f"cosine mean {agreement['mean']:.4f} min {agreement['min']:.4f} "
+            f"p5 {agreement['p5']:.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
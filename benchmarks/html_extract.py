@@ -0,0 +1,96 @@
+"""Compare `extract_main_content` with `get_title_n_content_from_html`.
+
+Runs both extractors over a fixed corpus of saved HTML pages and reports
+time per page, extracted characters and the number of chunks each one
+would send to the embedding model. The malformed and boilerplate-named
+markup of data/extract_cases.json is checked first, each case's content
+must contain its expected text.
+
+    python benchmarks/html_extract.py --repeat 50
+    python benchmarks/html_extract.py path/to/pages --show
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(project_root)
+
+from utils.chunking import recursive_chunking
+from utils.get_html import get_title_n_content_from_html
+from utils.html_extract import extract_main_content
+from utils.text_preprocessing import process_text
+
+CORPUS_DIR = os.path.join(current_dir, "data", "html")
+CASES = os.path.join(current_dir, "data", "extract_cases.json")
+EXTRACTORS = {
+    "beautifulsoup": get_title_n_content_from_html,
+    "streaming": extract_main_content,
+}
+
+
+def check_cases(path: str) -> bool:
+    with open(path, encoding="utf-8") as f:
+        cases = json.load(f)["cases"]
+    passed = 0
+    for case in cases:
+        _, content = extract_main_content(case["html"])
+        ok = case["expected"] in content
+        passed += ok
+        if not ok:
+            print(f"FAIL {case['name']}: {content!r}")
+    print(f"{passed}/{len(cases)} extraction cases passed")
+    return passed == len(cases)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus_dir", nargs="?", default=CORPUS_DIR)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--show", action="store_true", help="print extracted text")
+    parser.add_argument("--cases", default=CASES)
+    args = parser.parse_args()
+
+    if not check_cases(args.cases):
+        sys.exit(1)
+
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(args.corpus_dir, "*.html"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages[os.path.basename(path)] = f.read()
+    if not pages:
+        sys.exit(f"No .html files in {args.corpus_dir}")
+
+    totals = {name: [0.0, 0, 0] for name in EXTRACTORS}
+    for page_name, html in pages.items():
+        for name, extract in EXTRACTORS.items():
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                title, content = extract(html)
+            seconds = (time.perf_counter() - t0) / args.repeat
+            content = process_text(content)
+            chunks = recursive_chunking(content, int(512 * 0.8), 10) if content else []
+            totals[name][0] += seconds
+            totals[name][1] += len(content)
+            totals[name][2] += len(chunks)
+            print(
+                f"{page_name:>24} {name:>14}: {seconds * 1000:7.2f} ms, "
+                f"{len(content):6d} chars, {len(chunks):3d} chunks, title={title!r}"
+            )
+            if args.show:
+                print(content, end="\n\n")
+
+    for name, (seconds, chars, chunks) in totals.items():
+        print(
+            f"{'total':>24} {name:>14}: {seconds * 1000:7.2f} ms, "
+            f"{chars:6d} chars, {chunks:3d} chunks"
+        )
+
+
+if __name__ == "__main__":
+    main()
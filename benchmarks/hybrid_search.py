@@ -0,0 +1,107 @@
+"""Recall and latency of dense, BM25 and hybrid (RRF) retrieval.
+
+Indexes the sentences of the saved HTML corpus in a NumPy backend and runs
+the queries of data/retrieval.json, a query being answered when one of the
+top `k` sentences contains its answer string. `--copies` repeats the corpus
+to measure latency on larger per-query corpora.
+
+    python benchmarks/hybrid_search.py --k 3 --copies 10
+    python benchmarks/hybrid_search.py --methods bm25   # no embedding model
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import uuid
+
+current_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(project_root)
+
+import numpy as np
+
+from utils.chunking import SENTENCE_BOUNDARY
+from utils.html_extract import extract_main_content
+from utils.vector_backends import NumpyBackend
+
+CORPUS_DIR = os.path.join(current_dir, "data", "html")
+DATASET = os.path.join(current_dir, "data", "retrieval.json")
+METHODS = ("dense", "bm25", "hybrid")
+
+
+def load_sentences(corpus_dir: str) -> list[tuple[str, str]]:
+    sentences = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, "*.html"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            title, content = extract_main_content(f.read())
+        sentences.extend(
+            (sentence.strip(), title or path)
+            for sentence in SENTENCE_BOUNDARY.split(content)
+            if sentence.strip()
+        )
+    return sentences
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", default=DATASET)
+    parser.add_argument("--corpus-dir", default=CORPUS_DIR)
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=METHODS)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--copies", type=int, default=1)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args()
+
+    with open(args.dataset, encoding="utf-8") as f:
+        queries = json.load(f)["queries"]
+    sentences = load_sentences(args.corpus_dir) * args.copies
+    needs_model = any(method != "bm25" for method in args.methods)
+    if needs_model:
+        from utils.vector_store import get_embedder, search_similar_texts
+
+        embedder = get_embedder()
+        vectors = embedder.encode([text for text, _ in sentences])
+    else:
+        vectors = np.zeros((len(sentences), 1), dtype=np.float32)
+
+    backend = NumpyBackend(vectors.shape[1])
+    backend.upsert(
+        [str(uuid.uuid4()) for _ in sentences],
+        vectors,
+        [
+            {"text": text, "title": title, "source": f"copy-{i}", "ingested_at": 0.0}
+            for i, (text, title) in enumerate(sentences)
+        ],
+    )
+    print(f"{len(sentences)} sentences, {len(queries)} queries, recall@{args.k}")
+
+    for method in args.methods:
+        found = 0
+        t0 = time.perf_counter()
+        for query in queries:
+            if method == "bm25":
+                results = backend.lexical_search(query["query"], args.k)
+                texts = [result["payload"]["text"] for result in results]
+            else:
+                results = search_similar_texts(  # type: ignore
+                    query["query"],
+                    args.k,
+                    backend=backend,
+                    threshold=args.threshold,
+                    hybrid=method == "hybrid",
+                )
+                texts = [result["text"] for result in results]
+            answer = query["answer"].lower()
+            found += any(answer in text.lower() for text in texts)
+        milliseconds = (time.perf_counter() - t0) * 1000 / len(queries)
+        print(
+            f"{method:>6}: recall {found / len(queries):.2f}, "
+            f"{milliseconds:.2f} ms/query"
+        )
+
+
+if __name__ == "__main__":
+    main()
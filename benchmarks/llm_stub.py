@@ -0,0 +1,104 @@
+"""Local OpenAI compatible chat completions stub to test `GeminiClient`.
+
+Streams a fixed answer with configurable delays and reports time to first
+token and total latency for consecutive requests over the same client.
+
+    python benchmarks/llm_stub.py --runs 5 --first-token-delay 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+current_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(project_root)
+
+ANSWER = "Cá chép là một loài cá nước ngọt phổ biến ở Việt Nam."
+
+
+def make_handler(first_token_delay: float, token_delay: float):
+    class ChatCompletionsHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        connections: set[tuple] = set()
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            type(self).connections.add(self.client_address)
+            time.sleep(first_token_delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for word in ANSWER.split(" "):
+                self._send_chunk(
+                    {
+                        "id": "stub",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body["model"],
+                        "choices": [{"index": 0, "delta": {"content": word + " "}}],
+                    }
+                )
+                time.sleep(token_delay)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+        def _send_chunk(self, data: dict):
+            self._write_chunk(f"data: {json.dumps(data)}\n\n".encode())
+
+        def _write_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return ChatCompletionsHandler
+
+
+def serve(first_token_delay: float = 0.2, token_delay: float = 0.01):
+    """Start the stub on a free port in a background thread."""
+    handler = make_handler(first_token_delay, token_delay)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, handler
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    args = parser.parse_args()
+
+    server, handler = serve(args.first_token_delay, args.token_delay)
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+    from mcp_client import GeminiClient
+
+    base_url = f"http://127.0.0.1:{server.server_port}/v1/"
+    gem = GeminiClient("stub", base_url=base_url)
+    messages = [{"role": "user", "content": "Cá chép là gì?"}]
+    for run in range(args.runs):
+        t0 = time.perf_counter()
+        tokens: list[str] = []
+        turn = await gem.stream_turn(messages, on_token=tokens.append)  # type: ignore
+        total = time.perf_counter() - t0
+        assert "".join(tokens).strip() == turn.content.strip() == ANSWER
+        print(
+            f"run {run}: time to first token "
+            f"{turn.time_to_first_token * 1000:.0f} ms, "  # type: ignore
+            f"total {total * 1000:.0f} ms"
+        )
+    print(f"{args.runs} requests over {len(handler.connections)} connection(s)")
+    await gem.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,44 @@
+"""Measure how long MCP servers take to start and answer `list_tools`.
+
+    python benchmarks/server_startup.py tools/search.py tools/weather.py --runs 3
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+from mcp import ClientSession, StdioServerParameters, stdio_client
+
+
+async def time_startup(script_path: str) -> tuple[float, float]:
+    server_params = StdioServerParameters(
+        command=sys.executable, args=[script_path], env=None
+    )
+    t0 = time.perf_counter()
+    async with stdio_client(server_params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            initialized = time.perf_counter() - t0
+            await session.list_tools()
+            listed = time.perf_counter() - t0
+    return initialized, listed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("scripts", nargs="+")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    for script_path in args.scripts:
+        for run in range(args.runs):
+            initialized, listed = await time_startup(script_path)
+            print(
+                f"{script_path} run {run}: initialize {initialized * 1000:.0f} ms, "
+                f"list_tools {listed * 1000:.0f} ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
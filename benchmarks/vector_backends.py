@@ -0,0 +1,82 @@
+"""Compare the Qdrant and in-process NumPy vector backends.
+
+Uses random unit vectors so no embedding model is needed.
+
+    python benchmarks/vector_backends.py --chunks 500 --queries 200
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+current_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(project_root)
+
+import numpy as np
+
+from utils.vector_backends import NumpyBackend, QdrantBackend, VectorBackend
+
+
+def bench(
+    backend: VectorBackend, vectors: np.ndarray, queries: np.ndarray, limit: int
+):
+    namespace = uuid.uuid4().hex
+    ids = [str(uuid.uuid4()) for _ in range(len(vectors))]
+    payloads = [
+        {
+            "text": f"chunk {i}",
+            "title": None,
+            "source": f"https://example.com/{i % 10}",
+            "namespace": namespace,
+            "ingested_at": time.time(),
+        }
+        for i in range(len(vectors))
+    ]
+    t0 = time.perf_counter()
+    backend.upsert(ids, vectors, payloads)
+    upsert_seconds = time.perf_counter() - t0
+
+    latencies = []
+    for query in queries:
+        t0 = time.perf_counter()
+        backend.search(query, limit, namespace=namespace)
+        latencies.append(time.perf_counter() - t0)
+    backend.delete(namespace=namespace)
+
+    latencies_ms = np.array(latencies) * 1000
+    print(
+        f"{type(backend).__name__:>14}: upsert {upsert_seconds * 1000:8.1f} ms, "
+        f"search p50 {np.percentile(latencies_ms, 50):6.2f} ms, "
+        f"p95 {np.percentile(latencies_ms, 95):6.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.chunks, args.dim)).astype(np.float32)
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    bench(NumpyBackend(args.dim), vectors, queries, args.limit)
+    try:
+        backend = QdrantBackend(args.dim, "vector_store_benchmark")
+    except Exception as e:
+        print(f"Skipping Qdrant backend: {e}")
+        return
+    try:
+        bench(backend, vectors, queries, args.limit)
+    finally:
+        backend.drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,114 @@
 import contextlib
+import multiprocessing
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows: only `check_workers` guards the worker count
+    fcntl = None
 
 from fastapi import FastAPI
 
-from tools import search
+from tools import dummy, search, summarize_web_content, weather
+from utils.embed_service import EMBED_SERVICE_SOCKET
+from utils.get_html import close_async_client
+from utils.parse_pool import shutdown_parse_pool
+from utils.vector_store import (
+    VECTOR_BACKEND,
+    close_backend,
+    close_embed_model,
+    warm_up,
+)
+
+GATEWAY_HOST = os.getenv("GATEWAY_HOST", "127.0.0.1")
+GATEWAY_PORT = int(os.getenv("GATEWAY_PORT", "8000"))
+# Each worker is a process. More than one needs state every worker can share:
+# the embedding service (EMBED_SERVICE_SOCKET) and the qdrant backend, as the
+# numpy backend's snapshots would overwrite each other. `uvicorn --workers`
+# defaults to $WEB_CONCURRENCY, so it is read as well
+GATEWAY_WORKERS = int(os.getenv("GATEWAY_WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
 
+# Every tool server is served at /<name>/mcp/ (without the trailing slash every
+# request is redirected first)
+SERVERS = {
+    "weather": weather.mcp,
+    "summarize": summarize_web_content.mcp,
+    "search": search.mcp,
+    "dummy": dummy.mcp,
+}
+for server in SERVERS.values():
+    # No session state is kept between requests, so any worker can serve any
+    # request of a client
+    server.settings.stateless_http = True
 
-# Create a combined lifespan to manage both session managers
+
+# Create a combined lifespan to manage all the session managers
 @contextlib.asynccontextmanager
 async def lifespan(app: FastAPI):
     async with contextlib.AsyncExitStack() as stack:
-        await stack.enter_async_context(search.mcp.session_manager.run())
+        check_workers()
+        if not shares_state():
+            stack.enter_context(single_worker())
+        for server in SERVERS.values():
+            await stack.enter_async_context(server.session_manager.run())
+        stack.push_async_callback(close_async_client)
+        stack.callback(shutdown_parse_pool)
+        stack.callback(close_embed_model)
+        stack.callback(close_backend)
+        if search.WARM_UP:
+            warm_up()
         yield
-                    
+
+
 app = FastAPI(lifespan=lifespan)
-app.mount("/search", search.mcp.streamable_http_app())
+for name, server in SERVERS.items():
+    app.mount(f"/{name}", server.streamable_http_app())
+
+
+def shares_state() -> bool:
+    """Whether several workers can serve the tools, see GATEWAY_WORKERS."""
+    return bool(EMBED_SERVICE_SOCKET) and VECTOR_BACKEND == "qdrant"
+
+
+def check_workers(workers: int = GATEWAY_WORKERS):
+    if workers > 1 and not shares_state():
+        raise SystemExit(
+            f"GATEWAY_WORKERS={workers} needs EMBED_SERVICE_SOCKET and "
+            "VECTOR_BACKEND=qdrant, run a single worker otherwise"
+        )
+
+
+@contextlib.contextmanager
+def single_worker():
+    """Refuse to start a second worker of the same uvicorn server.
+
+    `uvicorn main:app --workers N` starts its workers without going through
+    `check_workers` or setting any variable, but spawns all of them from one
+    supervisor process. A lock named after that process lets only one of them
+    start. A worker restarted by `--reload` only starts once the previous one
+    exited, releasing the lock.
+    """
+    supervisor = multiprocessing.parent_process()
+    if supervisor is None or fcntl is None:
+        yield
+        return
+    path = os.path.join(tempfile.gettempdir(), f"mcp_hub-gateway-{supervisor.pid}.lock")
+    with open(path, "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise SystemExit(
+                "Another worker of this server is running, several workers "
+                "need EMBED_SERVICE_SOCKET and VECTOR_BACKEND=qdrant"
+            ) from None
+        yield
 
 
+if __name__ == "__main__":
+    import uvicorn
 
+    check_workers()
+    uvicorn.run(
+        "main:app", host=GATEWAY_HOST, port=GATEWAY_PORT, workers=GATEWAY_WORKERS
+    )
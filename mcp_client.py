@@ -1,204 +1,469 @@
 import asyncio
 import json
 import os
-from contextlib import AsyncExitStack
-from typing import Any, Iterable
+import time
+from contextlib import AbstractAsyncContextManager, AsyncExitStack
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Callable, Iterable
 
+import httpx
 from dotenv import load_dotenv
 from mcp import ClientSession, StdioServerParameters, stdio_client
-from mcp.types import CallToolResult
-from openai import OpenAI
+from mcp.client.streamable_http import streamablehttp_client
+from mcp.types import (
+    CallToolResult,
+    ServerNotification,
+    Tool,
+    ToolListChangedNotification,
+)
+from openai import NOT_GIVEN, AsyncOpenAI, DefaultAsyncHttpxClient
 from openai.types.chat import (
     ChatCompletionMessageParam,
     ChatCompletionToolParam,
 )
-from openai.types.chat.chat_completion import Choice
 from openai.types.shared_params import FunctionDefinition
 
 load_dotenv()  # load environment variables from .env
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 assert GEMINI_API_KEY is not None, "GEMINI_API_KEY must be set in .env file"
+GEMINI_BASE_URL = os.getenv(
+    "GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/openai/"
+)
 
 SYSTEM_PROMPT = """Use search tool to find information on the web then summarize the information found related to the question in form of a short paragraph."""
 
 
-class GeminiClient(OpenAI):
-    def __init__(self, api_key: str):
+@dataclass
+class AssistantTurn:
+    """One streamed model reply: its text and/or the tool calls it requested."""
+
+    content: str = ""
+    tool_calls: list[dict[str, Any]] = field(default_factory=list)
+    total_tokens: int = 0
+    time_to_first_token: float | None = None
+
+
+class GeminiClient(AsyncOpenAI):
+    """Async Gemini client over the OpenAI compatible API.
+
+    Requests share one pooled HTTP client so that consecutive calls reuse
+    the same keep-alive connection instead of paying a new TLS handshake.
+    """
+
+    def __init__(self, api_key: str, base_url: str = GEMINI_BASE_URL):
         super().__init__(
             api_key=api_key,
-            base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
+            base_url=base_url,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=20,
+                    max_keepalive_connections=10,
+                    keepalive_expiry=120,
+                )
+            ),
         )
 
-    def response(
+    async def stream_turn(
         self,
         messages: Iterable[ChatCompletionMessageParam],
-        tools: Iterable[ChatCompletionToolParam] = [],
-        # model: str = "gemini-2.0-flash",
+        tools: list[ChatCompletionToolParam] | None = None,
+        on_token: Callable[[str], None] | None = None,
         model: str = "gemini-2.5-flash-preview-05-20",
         temperature: int = 0,
-    ):
-        return self.chat.completions.create(
+    ) -> AssistantTurn:
+        """Stream one reply, passing text tokens to `on_token` as they arrive
+        and assembling the streamed tool call fragments."""
+        t0 = time.perf_counter()
+        turn = AssistantTurn()
+        content: list[str] = []
+        tool_calls: dict[int, dict[str, Any]] = {}
+        stream = await self.chat.completions.create(
             model=model,
             messages=messages,
-            tools=tools,
-            tool_choice="auto",
+            tools=tools or NOT_GIVEN,
+            tool_choice="auto" if tools else NOT_GIVEN,
             temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
         )
+        async for chunk in stream:
+            if chunk.usage:
+                turn.total_tokens = chunk.usage.total_tokens
+            if not chunk.choices:
+                continue
+            if turn.time_to_first_token is None:
+                turn.time_to_first_token = time.perf_counter() - t0
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content.append(delta.content)
+                if on_token:
+                    on_token(delta.content)
+            for tool_call in delta.tool_calls or []:
+                index = tool_call.index if tool_call.index is not None else 0
+                call = tool_calls.setdefault(
+                    index,
+                    {
+                        "id": f"call_{index}",
+                        "type": "function",
+                        "function": {"name": "", "arguments": ""},
+                    },
+                )
+                if tool_call.id:
+                    call["id"] = tool_call.id
+                if tool_call.function and tool_call.function.name:
+                    call["function"]["name"] += tool_call.function.name
+                if tool_call.function and tool_call.function.arguments:
+                    call["function"]["arguments"] += tool_call.function.arguments
+        turn.content = "".join(content)
+        turn.tool_calls = [tool_calls[index] for index in sorted(tool_calls)]
+        return turn
+
+
+class ToolRegistry:
+    """Tools of every connected session, listed once and cached.
+
+    Keeps a name -> session map for dispatch and the merged OpenAI tool
+    schemas. A session's tools are listed again only after it sends a
+    tool-list-changed notification.
+    """
+
+    def __init__(self):
+        self._session_tools: dict[ClientSession, list[Tool]] = {}
+        self._stale: set[ClientSession] = set()
+        self._owners: dict[str, ClientSession] = {}
+        self.schemas: list[ChatCompletionToolParam] = []
+
+    async def add(self, session: ClientSession):
+        self._session_tools[session] = (await session.list_tools()).tools
+        self._rebuild()
+
+    def invalidate(self, session: ClientSession):
+        self._stale.add(session)
+
+    async def refresh(self):
+        """List the tools again for the sessions invalidated since last time."""
+        if not self._stale:
+            return
+        stale, self._stale = self._stale, set()
+        for session in stale:
+            self._session_tools[session] = (await session.list_tools()).tools
+        self._rebuild()
+
+    def get(self, tool_name: str) -> ClientSession | None:
+        return self._owners.get(tool_name)
+
+    def _rebuild(self):
+        self._owners = {}
+        self.schemas = []
+        for session, tools in self._session_tools.items():
+            for tool in tools:
+                if tool.name in self._owners:
+                    print(f"⚠️ Duplicate tool {tool.name}, keeping the first one")
+                    continue
+                self._owners[tool.name] = session
+                self.schemas.append(
+                    ChatCompletionToolParam(
+                        function=FunctionDefinition(
+                            name=tool.name,
+                            description=tool.description or "",
+                            parameters=tool.inputSchema,
+                        ),
+                        type="function",
+                    )
+                )
+
+
+MAX_PARALLEL_TOOL_CALLS = 4
+TOOL_TIMEOUT = 120  # seconds
+# Budget of one query: tool rounds, tokens over all LLM calls and seconds
+MAX_TOOL_ROUNDS = 5
+MAX_QUERY_TOKENS = 200_000
+MAX_QUERY_SECONDS = 300
 
 
 class MCPClient:
-    def __init__(self):
+    def __init__(
+        self,
+        max_parallel_tool_calls: int = MAX_PARALLEL_TOOL_CALLS,
+        tool_timeout: float = TOOL_TIMEOUT,
+        tool_timeouts: dict[str, float] | None = None,
+        max_tool_rounds: int = MAX_TOOL_ROUNDS,
+        max_query_tokens: int = MAX_QUERY_TOKENS,
+        max_query_seconds: float = MAX_QUERY_SECONDS,
+    ):
+        """
+        Args:
+            max_parallel_tool_calls: How many tool calls may run at once.
+            tool_timeout: Default seconds to wait for a tool result.
+            tool_timeouts: Per tool name overrides of `tool_timeout`.
+            max_tool_rounds: Most LLM turns allowed to call tools per query.
+            max_query_tokens: Tokens per query after which tools are dropped.
+            max_query_seconds: Seconds per query for the LLM calls and tool
+                rounds, the final answer without tools is given after it.
+        """
         # Initialize session and client objects
         self.sessions: list[ClientSession] = []
-        self.exit_stack = AsyncExitStack()
+        self.tools = ToolRegistry()
         self.gem = GeminiClient(GEMINI_API_KEY)  # type: ignore
+        self.tool_timeout = tool_timeout
+        self.tool_timeouts = tool_timeouts or {}
+        self.max_tool_rounds = max_tool_rounds
+        self.max_query_tokens = max_query_tokens
+        self.max_query_seconds = max_query_seconds
+        self._tool_semaphore = asyncio.Semaphore(max_parallel_tool_calls)
+        # Each connection is owned by its own task so that servers can be
+        # started concurrently: anyio transports must be closed by the task
+        # that opened them.
+        self._server_tasks: list[asyncio.Task] = []
+        self._closing = asyncio.Event()
 
     # methods will go here
     async def connect_to_servers(self, servers_script_paths: list[str]):
-        for servers_script_path in servers_script_paths:
-            await self.connect_to_server(servers_script_path)
+        """Start all the servers concurrently."""
+        results = await asyncio.gather(
+            *(self._open_session(path) for path in servers_script_paths),
+            return_exceptions=True,
+        )
+        for path, result in zip(servers_script_paths, results):
+            if isinstance(result, BaseException):
+                print(f"❌ Failed to connect to {path}: {result}")
+                continue
+            self.sessions.append(result)
+            await self.tools.add(result)
 
     async def connect_to_server(self, servers_script_path: str):
         """Connect to an MCP server
 
         Args:
-            server_script_path: Path to the server script (.py or .js)
+            server_script_path: Path to the server script (.py or .js) or URL
+                of a streamable HTTP server (e.g. http://localhost:8000/search/mcp/)
         """
-        is_python = servers_script_path.endswith(".py")
-        is_js = servers_script_path.endswith(".js")
-        if not (is_python or is_js):
-            raise ValueError("Server script must be a .py or .js file")
-
-        command = "python" if is_python else "node"
-        server_params = StdioServerParameters(
-            command=command, args=[servers_script_path], env=None
-        )
-
-        stdio_transport = await self.exit_stack.enter_async_context(
-            stdio_client(server_params)
-        )
-        self.stdio, self.write = stdio_transport
+        session = await self._open_session(servers_script_path)
+        self.sessions.append(session)
+        await self.tools.add(session)
 
-        session = await self.exit_stack.enter_async_context(
-            ClientSession(self.stdio, self.write)
+    async def _open_session(self, server: str) -> ClientSession:
+        """Open a session with a server script (over stdio) or with the URL of
+        a streamable HTTP server such as the `main.py` gateway."""
+        if server.startswith(("http://", "https://")):
+            transport = streamablehttp_client(server)
+        else:
+            is_python = server.endswith(".py")
+            is_js = server.endswith(".js")
+            if not (is_python or is_js):
+                raise ValueError("Server must be a .py or .js file or an http(s) URL")
+
+            command = "python" if is_python else "node"
+            server_params = StdioServerParameters(
+                command=command, args=[server], env=None
+            )
+            transport = stdio_client(server_params)
+        loop = asyncio.get_running_loop()
+        ready: asyncio.Future[ClientSession] = loop.create_future()
+        self._server_tasks.append(
+            asyncio.create_task(self._run_session(transport, ready))
         )
+        return await ready
 
-        await session.initialize()
-
-        self.sessions.append(session)
+    async def _run_session(
+        self,
+        transport: AbstractAsyncContextManager[tuple],
+        ready: "asyncio.Future[ClientSession]",
+    ):
+        """Open a session, hand it over through `ready` and keep it open until
+        `cleanup` is called."""
+
+        async def on_message(message):
+            if isinstance(message, ServerNotification) and isinstance(
+                message.root, ToolListChangedNotification
+            ):
+                self.tools.invalidate(session)
+
+        try:
+            async with AsyncExitStack() as exit_stack:
+                # stdio yields (read, write), streamable HTTP adds a session id getter
+                read, write, *_ = await exit_stack.enter_async_context(transport)
+                session = await exit_stack.enter_async_context(
+                    ClientSession(read, write, message_handler=on_message)
+                )
+                await session.initialize()
+                ready.set_result(session)
+                await self._closing.wait()
+        except BaseException as e:
+            if not ready.done():
+                ready.set_exception(e)
+            elif not isinstance(e, asyncio.CancelledError):
+                print(f"Error closing session: {e}")
+
+    async def call_tool(
+        self,
+        tool_name: str,
+        tool_args: dict[str, Any],
+        deadline: float | None = None,
+    ) -> CallToolResult:
+        """Call a tool on the session serving it, within the parallelism limit
+        and the tool's timeout.
 
-        # List available tools
-        # response = await self.session.list_tools()
-        # tools = response.tools
-        # print("\nConnected to server with tools:", [tool.name for tool in tools])
+        Args:
+            deadline: `time.perf_counter()` value by which the result is
+                needed, waiting for a free slot included.
+        """
+        session = self.tools.get(tool_name)
+        if session is None:
+            raise Exception(f"Tool {tool_name} not found in sessions.")
+        timeout = self.tool_timeouts.get(tool_name, self.tool_timeout)
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.perf_counter())
+            if timeout <= 0:
+                raise TimeoutError(f"No time left in the query budget for {tool_name}")
+
+        async def call() -> CallToolResult:
+            async with self._tool_semaphore:
+                return await session.call_tool(
+                    tool_name,
+                    tool_args,
+                    read_timeout_seconds=timedelta(seconds=timeout),
+                )
+
+        try:
+            return await asyncio.wait_for(call(), timeout)
+        except TimeoutError:
+            raise TimeoutError(f"Tool {tool_name} timed out after {timeout:.1f}s")
+
+    async def process_query(
+        self, query: str, on_token: Callable[[str], None] | None = None
+    ) -> str:
+        """Process a query using Gemini and available tools
+
+        Runs tool rounds until the model answers without calling a tool or
+        the round, token or time budget is spent, then asks for a final
+        answer without tools.
 
-    async def process_query(self, query: str) -> str:
+        Args:
+            query: The user query.
+            on_token: Called with every piece of output as soon as it is
+                available, the answer is streamed token by token.
+        """
         assert self.sessions is not None, (
             "Session must be initialized before processing a query"
         )
-        """Process a query using Claude and available tools"""
         messages: list[ChatCompletionMessageParam] = [
             {"role": "user", "content": query}
         ]
+        final_text: list[str] = []
 
-        available_tools: list[ChatCompletionToolParam] = []
-        for session in self.sessions:
-            response = await session.list_tools()
-            available_tools.extend(
-                [
-                    ChatCompletionToolParam(
-                        function=FunctionDefinition(
-                            name=tool.name,
-                            description=tool.description or "",
-                            parameters=tool.inputSchema,
-                        ),
-                        type="function",
-                    )
-                    for tool in response.tools
-                ]
+        def emit(text: str):
+            final_text.append(text)
+            if on_token:
+                on_token(text + "\n")
+
+        await self.tools.refresh()
+        started = time.perf_counter()
+        deadline = started + self.max_query_seconds
+        total_tokens = 0
+        for round_index in range(self.max_tool_rounds + 1):
+            elapsed = time.perf_counter() - started
+            in_budget = (
+                round_index < self.max_tool_rounds
+                and total_tokens < self.max_query_tokens
+                and elapsed < self.max_query_seconds
             )
+            if not in_budget:
+                print(
+                    f"Budget reached after {round_index} round(s), "
+                    f"{total_tokens} tokens, {elapsed:.1f}s: answering without tools"
+                )
 
-        tool_choice_res = self.gem.response(messages, tools=available_tools)
-
-        if not tool_choice_res:
-            return "No tool choice response from Gemini"
+            t0 = time.perf_counter()
+            try:
+                # Only the final answer may run past the time budget
+                turn = await asyncio.wait_for(
+                    self.gem.stream_turn(
+                        messages,
+                        tools=self.tools.schemas if in_budget else None,
+                        on_token=on_token,
+                    ),
+                    deadline - t0 if in_budget else None,
+                )
+            except TimeoutError:
+                print(f"Round {round_index}: LLM call stopped at the time budget")
+                continue
+            llm_seconds = time.perf_counter() - t0
+            total_tokens += turn.total_tokens
+            if turn.content:
+                final_text.append(turn.content)
+                if on_token:
+                    on_token("\n")
+            if not turn.tool_calls:
+                print(
+                    f"Round {round_index}: answer in {llm_seconds:.2f}s "
+                    f"(first token {turn.time_to_first_token or 0:.2f}s)"
+                )
+                break
+
+            messages.append(
+                {
+                    "role": "assistant",
+                    "content": turn.content or None,
+                    "tool_calls": turn.tool_calls,  # type: ignore
+                }
+            )
+            t0 = time.perf_counter()
+            results = await self.call_tools(turn.tool_calls, deadline)
+            tools_seconds = time.perf_counter() - t0
+            for tool_call, (text, is_error) in zip(turn.tool_calls, results):
+                tool_name = tool_call["function"]["name"]
+                if is_error:
+                    emit(f"Error calling tool {tool_name}: {text}")
+                else:
+                    emit(
+                        f"[Calling tool {tool_name} with args "
+                        f"{tool_call['function']['arguments']}]"
+                    )
+                messages.append(
+                    {"role": "tool", "tool_call_id": tool_call["id"], "content": text}
+                )
+            print(
+                f"Round {round_index}: LLM {llm_seconds:.2f}s, "
+                f"{len(turn.tool_calls)} tool call(s) {tools_seconds:.2f}s"
+            )
 
-        # Process response and handle tool calls
-        final_text: list[str] = []
+        if not final_text:
+            print("⚠️ No response from Gemini")
+        return "\n".join(final_text)
 
-        assistant_message_content: list[str | Choice] = []
-        print(f"\nTool choices: {tool_choice_res.choices}. Only choosing first one.")
-        for index, choice in enumerate(tool_choice_res.choices[:1]):
-            print(f"Choice {index}: {choice}")
-            if cnt_msg := choice.message.content:
-                final_text.append(cnt_msg)
-                assistant_message_content.append(cnt_msg)
-            elif tool_calls := choice.message.tool_calls:
-                results_tool_call: list[CallToolResult] = []
-                for tool_call in tool_calls:
-                    tool_name = tool_call.function.name
-                    tool_args: dict[str, Any] = (
-                        json.loads(tool_call.function.arguments)
-                        if tool_call.function.arguments
-                        else {}
-                    )
+    async def call_tools(
+        self, tool_calls: list[dict[str, Any]], deadline: float | None = None
+    ) -> list[tuple[str, bool]]:
+        """Execute tool calls concurrently.
 
-                    assert isinstance(tool_args, dict), (
-                        f"Tool arguments must be a dictionary, got {type(tool_args)}"
-                    )
-                    # Execute tool call
-                    # TODO need to transform self.sessions to better data structure
-                    # result = await self.sessions.call_tool(tool_name, tool_args)
-                    result = None
-                    is_tool_called = False
-                    for session in self.sessions:
-                        if tool_name in [
-                            tool.name for tool in (await session.list_tools()).tools
-                        ]:
-                            result = await session.call_tool(tool_name, tool_args)
-                            is_tool_called = True
-                            break
-
-                    assert isinstance(result, CallToolResult)
-                    if not is_tool_called:
-                        raise Exception(f"Tool {tool_name} not found in sessions.")
-
-                    if result.isError:
-                        final_text.append(
-                            f"Error calling tool {tool_name}"  # FIX can not get error message
-                        )
-                        continue
-                    results_tool_call.append(result)
-                    final_text.append(
-                        f"[Calling tool {tool_name} with args {tool_args}]"
-                    )
+        Args:
+            deadline: `time.perf_counter()` value after which the calls still
+                running are abandoned and reported as errors.
 
-                    assistant_message_content.append(choice)
-                    final_text.append("Result tool call: " + str(results_tool_call))
-                    messages.append(
-                        {
-                            "role": "assistant",
-                            "content": json.dumps(
-                                {
-                                    "tool_name": tool_name,
-                                    "tool_result": str(result),
-                                }
-                            ),
-                        }
-                    )
+        Returns:
+            list: (text result, is error) per call, in the order of the calls.
+        """
 
-        # Get next response from GEMINI
-        # rephase_res = self.gem.response(messages=messages, tools=available_tools)
-        print("RUN HEER 1")
-        rephase_res = self.gem.response(messages=messages)
-        print("RUN HEER 2")
-        if content := rephase_res.choices[0].message.content:
-            final_text.append(content)
-        else:
-            print("⚠️ No response from Gemini")
+        async def run(tool_call: dict[str, Any]) -> tuple[str, bool]:
+            tool_name = tool_call["function"]["name"]
+            try:
+                arguments = tool_call["function"]["arguments"]
+                tool_args = json.loads(arguments) if arguments else {}
+                assert isinstance(tool_args, dict), (
+                    f"Tool arguments must be a dictionary, got {type(tool_args)}"
+                )
+                result = await self.call_tool(tool_name, tool_args, deadline)
+            except Exception as e:
+                return str(e), True
+            text = "\n".join(
+                content.text for content in result.content if content.type == "text"
+            )
+            return text, result.isError
 
-        return "\n".join(final_text)
+        return await asyncio.gather(*(run(tool_call) for tool_call in tool_calls))
 
     async def chat_loop(self):
         """Run an interactive chat loop"""
@@ -207,29 +472,34 @@ class MCPClient:
 
         while True:
             try:
-                query = input("\nQuery: ").strip()
+                # Read in a thread so MCP sessions keep running meanwhile
+                query = (await asyncio.to_thread(input, "\nQuery: ")).strip()
 
                 if query.lower() == "quit" or query.lower() == "exit" or query == "q":
                     break
                 if not query:
                     continue
 
-                response = await self.process_query(query)
-                print("\n" + response)  # DEBUG str(response)
-                print("-" * 50)
+                print()
+                await self.process_query(
+                    query, on_token=lambda token: print(token, end="", flush=True)
+                )
+                print("\n" + "-" * 50)
 
             except Exception as e:
                 print(f"\n❌ Error: {str(e)}")
 
     async def cleanup(self):
         """Clean up resources"""
-        await self.exit_stack.aclose()
+        self._closing.set()
+        await asyncio.gather(*self._server_tasks, return_exceptions=True)
+        await self.gem.close()
 
 
 async def main():
     if len(sys.argv) < 2:
         print(
-            "Usage: python client.py <path_to_mcp_server_1_script> <path_to_mcp_server_2_script> ..."
+            "Usage: python client.py <path_to_mcp_server_1_script or url> <path_to_mcp_server_2_script or url> ..."
         )
         sys.exit(1)
 
@@ -0,0 +1,65 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils import vector_store
+from utils.vector_backends import NumpyBackend
+
+
+class FakeEmbedModel:
+    """Stands in for `EmbedModel` without loading a model.
+
+    Texts listed in `vectors` get that vector, any other text a fixed
+    pseudo-random one derived from its characters.
+    """
+
+    model_name = model_id = "fake-embed-model"
+    max_seq_length = 128
+
+    def __init__(self, dim: int = 4, vectors: dict[str, list[float]] | None = None):
+        self.dim = dim
+        self.vectors = vectors or {}
+        self.calls = 0
+        self.texts = 0
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        self.calls += 1
+        self.texts += len(texts)
+        vectors = np.array([self._vector(text) for text in texts], dtype=np.float32)
+        return vectors[0] if single else vectors.reshape(-1, self.dim)
+
+    def _vector(self, text: str) -> np.ndarray:
+        if text in self.vectors:
+            return np.asarray(self.vectors[text], dtype=np.float32)
+        seed = sum(ord(c) * (i + 1) for i, c in enumerate(text)) % 2**32
+        return np.random.default_rng(seed).random(self.dim).astype(np.float32)
+
+    def stats(self) -> dict:
+        return {}
+
+    def flush(self) -> None:
+        pass
+
+
+@pytest.fixture
+def fake_model() -> FakeEmbedModel:
+    return FakeEmbedModel()
+
+
+@pytest.fixture
+def store(monkeypatch, fake_model) -> NumpyBackend:
+    """An in-memory backend, and `fake_model` as the vector store's embedder."""
+    backend = NumpyBackend(fake_model.dim)
+    monkeypatch.setattr(vector_store, "_embed_model", fake_model)
+    monkeypatch.setattr(vector_store, "_embedder", fake_model)
+    monkeypatch.setattr(vector_store, "_vector_backend", backend)
+    return backend
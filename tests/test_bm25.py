@@ -0,0 +1,53 @@
+import numpy as np
+
+from utils.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_normalizes_case_and_unicode():
+    decomposed = "Cá Chép".replace("á", "á").replace("é", "é")
+    assert tokenize(decomposed) == tokenize("cá  chép") == ["cá", "chép"]
+
+
+def test_rare_terms_outweigh_common_ones():
+    index = BM25Index()
+    index.add(["cá chép nuôi ao", "cá rô phi", "cá trắm cỏ", "cá mè hoa"])
+    ranking = index.search("cá chép", 4)
+    assert ranking[0][0] == 0
+    assert ranking[0][1] > 2 * ranking[1][1]
+    assert index.search("không có", 4) == []
+
+
+def test_statistics_follow_the_mask():
+    index = BM25Index()
+    index.add(["chép", "chép", "chép rô"])
+    everything = index.scores("rô")
+    only_third = index.scores("rô", mask=np.array([False, False, True]))
+    assert everything[:2].tolist() == only_third[:2].tolist() == [0.0, 0.0]
+    # Alone in the masked corpus, "rô" is no longer rare
+    assert only_third[2] < everything[2]
+
+
+def test_keep_renumbers_documents():
+    index = BM25Index()
+    index.add(["một", "hai", "ba"])
+    index.keep(np.array([True, False, True]))
+    assert len(index) == 2
+    assert index.search("ba", 2)[0][0] == 1
+    index.add(["bốn"])
+    assert index.search("bốn", 3)[0][0] == 2
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=1)
+    assert list(fused) == ["a", "c", "b"]
+    assert fused["a"] == 1 / 2 + 1 / 3
+
+
+def test_add_grows_capacity_geometrically():
+    index = BM25Index()
+    capacities = set()
+    for i in range(1000):
+        index.add([f"tài liệu {i}"])
+        capacities.add(len(index._all_lengths))
+    assert len(capacities) <= 3
+    assert index.search("999", 3)[0][0] == 999
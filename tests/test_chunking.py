@@ -0,0 +1,37 @@
+import re
+
+from utils.chunking import token_chunking
+
+
+def whitespace_tokenizer(text: str, **kwargs) -> dict:
+    """Stands in for a fast tokenizer, one token per word."""
+    return {"offset_mapping": [m.span() for m in re.finditer(r"\S+", text)]}
+
+
+def count_tokens(text: str) -> int:
+    return len(text.split())
+
+
+def test_chunks_hold_whole_sentences_within_the_budget():
+    text = "Một hai ba. Bốn năm. Sáu bảy tám chín. Mười."
+    chunks = token_chunking(text, whitespace_tokenizer, 5, overlap_sentences=0)
+    assert chunks == ["Một hai ba. Bốn năm.", "Sáu bảy tám chín. Mười."]
+    assert all(count_tokens(chunk) <= 5 for chunk in chunks)
+
+
+def test_consecutive_chunks_share_the_overlap():
+    text = "A b. C d. E f. G h."
+    chunks = token_chunking(text, whitespace_tokenizer, 4, overlap_sentences=1)
+    assert chunks == ["A b. C d.", "C d. E f.", "E f. G h."]
+
+
+def test_long_sentence_is_cut_at_token_boundaries():
+    text = "Ngắn. " + " ".join(f"từ{i}" for i in range(7)) + ". Cuối."
+    chunks = token_chunking(text, whitespace_tokenizer, 3, overlap_sentences=1)
+    assert chunks == ["Ngắn.", "từ0 từ1 từ2", "từ3 từ4 từ5", "từ6.", "Cuối."]
+
+
+def test_line_breaks_end_sentences_and_blank_text_has_no_chunks():
+    chunks = token_chunking("Tiêu đề\nNội dung bài", whitespace_tokenizer, 3, 0)
+    assert chunks == ["Tiêu đề", "Nội dung bài"]
+    assert token_chunking(" \n ", whitespace_tokenizer, 3) == []
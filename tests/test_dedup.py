@@ -0,0 +1,87 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from utils import pipeline
+from utils.dedup import ChunkDeduplicator
+from utils.pipeline import IngestionPipeline
+
+ARTICLE = [
+    "Cá chép là loài cá nước ngọt phổ biến, được nuôi rộng rãi trong ao đất "
+    "ở đồng bằng sông Hồng và đồng bằng sông Cửu Long.",
+    "Ao nuôi cần được tát cạn, vét bùn, bón vôi và phơi đáy từ năm đến bảy "
+    "ngày trước khi lấy nước vào qua lưới lọc.",
+    "Cá giống phải đồng đều, không dị hình, không xây xát và bơi lội nhanh "
+    "nhẹn, mật độ thả từ một đến hai con mỗi mét vuông.",
+    "Thức ăn công nghiệp có hàm lượng đạm từ hai mươi lăm đến ba mươi phần "
+    "trăm, cho ăn hai lần mỗi ngày vào buổi sáng và chiều mát.",
+    "Sau tám tháng nuôi, cá chép thương phẩm đạt trọng lượng trung bình "
+    "khoảng một cân hai mỗi con và có thể thu hoạch.",
+    "Định kỳ thay nước và theo dõi màu nước giúp phòng các bệnh thường gặp "
+    "như trùng mỏ neo, nấm thủy mi và xuất huyết.",
+]
+MIRRORED = [f"{text} Nguồn: báo Nông nghiệp." for text in ARTICLE]
+
+
+def test_new_chunks_are_kept():
+    deduplicator = ChunkDeduplicator()
+    assert [deduplicator.embed_text(text, "a") for text in ARTICLE] == ARTICLE
+    assert deduplicator.stats()["saved_ratio"] == 0.0
+
+
+def test_duplicates_are_dropped():
+    deduplicator = ChunkDeduplicator()
+    for text in ARTICLE:
+        deduplicator.embed_text(text, "a")
+    assert deduplicator.embed_text(MIRRORED[0], "a") is None
+    assert deduplicator.embed_text(MIRRORED[1], "b") is None
+    assert deduplicator.stats()["dropped"] == 2
+
+
+def test_mirrors_of_other_pages_share_a_vector_when_pages_are_kept_whole():
+    deduplicator = ChunkDeduplicator(keep_pages_whole=True)
+    for text in ARTICLE:
+        deduplicator.embed_text(text, "a")
+    # Overlapping windows of one page are still dropped
+    assert deduplicator.embed_text(MIRRORED[0], "a") is None
+    assert deduplicator.embed_text(MIRRORED[1], "b") == ARTICLE[1]
+    stats = deduplicator.stats()
+    assert (stats["dropped"], stats["shared"]) == (1, 1)
+
+
+def test_mirrored_pages_are_stored_whole_and_embedded_once(
+    monkeypatch, store, fake_model
+):
+    pages = {"https://a.example/": ARTICLE, "https://b.example/": MIRRORED}
+
+    async def get_html(url: str) -> str:
+        return url
+
+    monkeypatch.setattr(pipeline, "get_html_from_url_async", get_html)
+    ingestion = IngestionPipeline(
+        lambda url, html: (None, pages[url]),
+        namespace="test",
+        backend=store,
+        parse_workers=1,
+        embed_text=ChunkDeduplicator(keep_pages_whole=True).embed_text,
+    )
+    asyncio.run(ingestion.run(list(pages)))
+
+    points = store.scroll()
+    assert sorted(point["payload"]["text"] for point in points) == sorted(
+        ARTICLE + MIRRORED
+    )
+    assert fake_model.texts == len(ARTICLE)
+    vectors = {
+        point["payload"]["text"]: store._vectors[i] for i, point in enumerate(points)
+    }
+    for text, mirrored in zip(ARTICLE, MIRRORED):
+        assert np.array_equal(vectors[text], vectors[mirrored])
+
+
+@pytest.mark.parametrize("text", ["", "một"])
+def test_short_chunks_have_a_signature(text):
+    deduplicator = ChunkDeduplicator()
+    assert deduplicator.embed_text(text, "a") == text
+    assert deduplicator.embed_text(text, "b") is None
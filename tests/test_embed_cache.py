@@ -0,0 +1,103 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from utils import embed_cache
+from utils.embed_cache import EmbeddingCache
+
+
+class CountingModel:
+    """Deterministic vectors, and the texts the model was actually run on."""
+
+    model_id = "counting-model"
+
+    def __init__(self):
+        self.encoded: list[str] = []
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return 4
+
+    def encode(self, texts, batch_size: int = 32, normalize_embeddings=False):
+        self.encoded.extend(texts)
+        return expected_vectors(texts, normalize_embeddings)
+
+
+def expected_vectors(texts, normalize_embeddings=False) -> np.ndarray:
+    return np.array(
+        [
+            [sum(map(ord, text)) % 997, len(text), int(normalize_embeddings), 1]
+            for text in texts
+        ],
+        dtype=np.float32,
+    )
+
+
+def test_hits_skip_the_model(tmp_path):
+    model = CountingModel()
+    cache = EmbeddingCache(model, cache_dir=str(tmp_path), max_entries=64)
+    first = cache.encode(["cá chép", "cá rô", "cá chép"])
+    assert model.encoded == ["cá chép", "cá rô"]
+    # Whitespace differences share a key, encode options do not
+    second = cache.encode(["cá  chép", "cá rô"])
+    normalized = cache.encode("cá rô", normalize_embeddings=True)
+    assert model.encoded == ["cá chép", "cá rô", "cá rô"]
+    assert np.array_equal(first[:2], second)
+    assert normalized[2] == 1
+    assert cache.stats()["hits"] == 2
+
+
+def test_survives_a_restart(tmp_path):
+    cache = EmbeddingCache(CountingModel(), cache_dir=str(tmp_path), max_entries=64)
+    cache.encode(["cá chép"])
+    cache.flush()
+    model = CountingModel()
+    reopened = EmbeddingCache(model, cache_dir=str(tmp_path), max_entries=64)
+    assert np.array_equal(reopened.encode(["cá chép"]), expected_vectors(["cá chép"]))
+    assert model.encoded == []
+    # Another size lives in its own files instead of resizing these
+    other = EmbeddingCache(CountingModel(), cache_dir=str(tmp_path), max_entries=128)
+    assert other.path != cache.path
+
+
+def test_full_sets_evict_the_least_recently_used_row(tmp_path):
+    model = CountingModel()
+    cache = EmbeddingCache(model, cache_dir=str(tmp_path), max_entries=2, ways=2)
+    cache.encode(["một"])
+    cache.encode(["hai"])
+    cache.encode(["một"])  # "hai" is now the least recently used
+    cache.encode(["ba"])
+    model.encoded.clear()
+    cache.encode(["một", "hai"])
+    assert model.encoded == ["hai"]
+
+
+def _write_many(cache_dir: str, tag: str) -> int:
+    cache = EmbeddingCache(CountingModel(), cache_dir=cache_dir, max_entries=32)
+    wrong = 0
+    for start in range(40):
+        texts = [f"{tag} {i}" for i in range(start, start + 10)]
+        texts += [f"shared {i}" for i in range(10)]
+        wrong += int((cache.encode(texts) != expected_vectors(texts)).any())
+    return wrong
+
+
+@pytest.mark.skipif(embed_cache.fcntl is None, reason="needs fcntl")
+def test_processes_sharing_the_cache_never_mix_vectors(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(3) as pool:
+        wrong = pool.starmap(
+            _write_many, [(str(tmp_path), tag) for tag in ("a", "b", "c")]
+        )
+    assert wrong == [0, 0, 0]
+    # Every row left behind holds the vector of the text its key names
+    cache = EmbeddingCache(CountingModel(), cache_dir=str(tmp_path), max_entries=32)
+    texts = [f"{tag} {i}" for tag in "abc" for i in range(50)]
+    texts += [f"shared {i}" for i in range(10)]
+    found = 0
+    for text in texts:
+        vector = cache._lookup(cache.key(text))
+        if vector is not None:
+            found += 1
+            assert np.array_equal(vector, expected_vectors([text])[0])
+    assert found
@@ -0,0 +1,61 @@
+import uuid
+
+from utils.vector_store import search_similar_texts
+
+QUERY = "Nguyễn Trãi là ai"
+NAME_CHUNK = "Nguyễn Trãi là nhà văn hóa lớn, tác giả Bình Ngô đại cáo."
+FISH_CHUNKS = [
+    f"Cá chép là loài cá nước ngọt, ao số {i} thả cá giống vào mùa xuân."
+    for i in range(20)
+]
+
+
+def add(store, fake_model, vectors: dict[str, list[float]]):
+    fake_model.vectors.update(vectors)
+    texts = list(vectors)
+    store.upsert(
+        [str(uuid.uuid4()) for _ in texts],
+        fake_model.encode(texts),
+        [{"text": text, "title": "", "source": "page"} for text in texts],
+    )
+
+
+def test_lexical_only_match_is_returned(store, fake_model):
+    fake_model.vectors[QUERY] = [1.0, 0.0, 0.0, 0.0]
+    # Neither chunk is near the query for the embedding
+    add(store, fake_model, {NAME_CHUNK: [0.3, 0.0, 1.0, 0.0]})
+    add(store, fake_model, {text: [0.0, 1.0, 0.0, 0.0] for text in FISH_CHUNKS})
+
+    assert search_similar_texts(QUERY, 3, hybrid=False) == []
+    results = search_similar_texts(QUERY, 3, hybrid=True)
+    assert [result["text"] for result in results] == [NAME_CHUNK]
+    assert results[0]["score"] < 0.5
+    assert results[0]["lexical_score"] > 1.0
+
+
+def test_stop_word_overlap_is_not_returned(store, fake_model):
+    fake_model.vectors["cá là gì"] = [1.0, 0.0, 0.0, 0.0]
+    add(store, fake_model, {NAME_CHUNK: [0.0, 0.0, 1.0, 0.0]})
+    add(store, fake_model, {text: [0.9, 0.5, 0.0, 0.0] for text in FISH_CHUNKS})
+
+    results = search_similar_texts("cá là gì", 5, hybrid=True)
+    assert len(results) == 5
+    assert NAME_CHUNK not in [result["text"] for result in results]
+
+
+def test_dense_and_lexical_rankings_are_fused(store, fake_model):
+    fake_model.vectors[QUERY] = [1.0, 0.0, 0.0, 0.0]
+    # Fourth for the embedding, first for BM25
+    add(store, fake_model, {NAME_CHUNK: [1.0, 0.12, 0.0, 0.0]})
+    add(
+        store,
+        fake_model,
+        {text: [1.0, 0.05 * i, 0.0, 0.0] for i, text in enumerate(FISH_CHUNKS)},
+    )
+
+    dense = search_similar_texts(QUERY, 3, hybrid=False)
+    hybrid = search_similar_texts(QUERY, 3, hybrid=True)
+    assert NAME_CHUNK not in [result["text"] for result in dense]
+    assert NAME_CHUNK in [result["text"] for result in hybrid]
+    fused_scores = [result["fused_score"] for result in hybrid]
+    assert fused_scores == sorted(fused_scores, reverse=True)
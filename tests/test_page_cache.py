@@ -0,0 +1,91 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from utils import get_html
+from utils.page_cache import PageCache
+
+URL = "https://example.com/bai-viet"
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch) -> PageCache:
+    """An empty page cache revalidating on every use, used by the fetchers."""
+    page_cache = PageCache(str(tmp_path), freshness=0)
+    monkeypatch.setattr(get_html, "get_page_cache", lambda: page_cache)
+    return page_cache
+
+
+def fetch(monkeypatch, handler) -> tuple[str, list[httpx.Request]]:
+    """Fetch URL with `handler` standing in for the server."""
+    requests: list[httpx.Request] = []
+
+    def record(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return handler(request)
+
+    async def run() -> str:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(record)) as client:
+            monkeypatch.setattr(get_html, "_async_client", client)
+            return await get_html.get_html_from_url_async(URL)
+
+    return asyncio.run(run()), requests
+
+
+def test_revalidates_with_the_stored_validators(cache, monkeypatch):
+    html, _ = fetch(
+        monkeypatch, lambda r: httpx.Response(200, text="v1", headers={"ETag": "e1"})
+    )
+    cache.put_text(URL, "tiêu đề", "nội dung")
+
+    html, requests = fetch(monkeypatch, lambda r: httpx.Response(304))
+    assert html == "v1"
+    assert requests[0].headers["If-None-Match"] == "e1"
+    # Not modified, the extracted text still matches
+    assert cache.get_text(URL) == ("tiêu đề", "nội dung")
+
+    html, _ = fetch(monkeypatch, lambda r: httpx.Response(200, text="v2"))
+    assert html == "v2"
+    assert cache.get_text(URL) is None
+
+
+@pytest.mark.parametrize(
+    "status, served, kept",
+    [(503, "v1", True), (403, "", True), (404, "", False), (410, "", False)],
+)
+def test_stale_copy_only_for_server_errors(cache, monkeypatch, status, served, kept):
+    fetch(monkeypatch, lambda r: httpx.Response(200, text="v1"))
+    html, _ = fetch(monkeypatch, lambda r: httpx.Response(status))
+    assert html == served
+    assert cache.has(URL) == kept
+
+
+def test_stale_copy_when_the_server_is_unreachable(cache, monkeypatch):
+    fetch(monkeypatch, lambda r: httpx.Response(200, text="v1"))
+
+    def unreachable(request):
+        raise httpx.ConnectError("unreachable", request=request)
+
+    assert fetch(monkeypatch, unreachable)[0] == "v1"
+
+
+def test_no_store_responses_are_not_cached(cache, monkeypatch):
+    headers = {"Cache-Control": "private, no-store"}
+    fetch(monkeypatch, lambda r: httpx.Response(200, text="v1", headers=headers))
+    assert not cache.has(URL)
+
+
+def test_prunes_the_pages_stored_least_recently(tmp_path):
+    cache = PageCache(str(tmp_path), max_bytes=4096)
+    html = os.urandom(400).hex()  # Incompressible, 800 bytes
+    for i in range(8):
+        url = f"https://example.com/{i}"
+        cache.put(url, html, {})
+        # Distinct write times, whatever the file system's resolution
+        for suffix in (".json", ".html.gz"):
+            os.utime(cache._path(url, suffix), (i, i))
+    assert sum(entry[1] for entry in cache._entries().values()) <= 4096
+    assert cache.has("https://example.com/7")
+    assert not cache.has("https://example.com/0")
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from utils import pipeline
+from utils.early_exit import StableAnswerSet
+from utils.pipeline import IngestionPipeline
+
+CHUNKS_PER_PAGE = 15
+QUERY = "cá chép"
+URLS = [f"https://example.com/page-{i}" for i in range(8)]
+
+
+@pytest.fixture(autouse=True)
+def fake_fetch(monkeypatch):
+    async def get_html(url: str) -> str:
+        await asyncio.sleep(0.001)
+        return f"<p>{url}</p>"
+
+    monkeypatch.setattr(pipeline, "get_html_from_url_async", get_html)
+
+
+def parse(url: str, html: str) -> tuple[str | None, list[str]]:
+    return url, [f"{url} chunk {i}" for i in range(CHUNKS_PER_PAGE)]
+
+
+def stored_chunks(store) -> dict[str, int]:
+    counts: dict[str, int] = {}
+    for point in store.scroll():
+        source = point["payload"]["source"]
+        counts[source] = counts.get(source, 0) + 1
+    return counts
+
+
+def run(ingestion: IngestionPipeline, urls=URLS):
+    return asyncio.run(ingestion.run(urls))
+
+
+def test_ingests_every_page(store):
+    ingestion = IngestionPipeline(parse, namespace="test", backend=store)
+    ids, metrics = run(ingestion)
+    assert len(ids) == len(URLS) * CHUNKS_PER_PAGE
+    assert stored_chunks(store) == {url: CHUNKS_PER_PAGE for url in URLS}
+    assert {stage["stage"] for stage in metrics} == {
+        "fetch",
+        "parse",
+        "embed",
+        "write",
+    }
+
+
+def test_small_pages_are_checked(store):
+    # Far fewer chunks than one upsert batch, every page is still checked
+    checks = []
+    ingestion = IngestionPipeline(
+        parse,
+        namespace="test",
+        backend=store,
+        stop_when=lambda: checks.append(1) and False,
+    )
+    run(ingestion, URLS[:5])
+    # Pages completed by the same embedding batch share a check
+    assert len(checks) >= 2
+    assert not ingestion.stopped_early
+
+
+def test_stops_once_the_answer_is_stable(store, fake_model):
+    # Three chunks of the first page answer the query, nothing later beats them
+    fake_model.vectors[QUERY] = [1.0, 0.0, 0.0, 0.0]
+    for i in range(CHUNKS_PER_PAGE):
+        vector = [1.0, 0.0, 0.0, 0.0] if i < 3 else [0.0, 0.0, 0.0, 1.0]
+        fake_model.vectors[f"{URLS[0]} chunk {i}"] = vector
+    answer_set = StableAnswerSet(QUERY, 3, namespace="test", threshold=0.99)
+    ingestion = IngestionPipeline(
+        parse,
+        namespace="test",
+        backend=store,
+        parse_workers=1,
+        queue_size=8,
+        stop_when=answer_set,
+    )
+    run(ingestion)
+    assert ingestion.stopped_early
+    assert answer_set.checks == 2
+    stored = stored_chunks(store)
+    assert len(stored) < len(URLS)
+    assert set(stored.values()) == {CHUNKS_PER_PAGE}
+
+
+def test_partly_stored_pages_are_deleted(store):
+    ingestion = IngestionPipeline(
+        parse,
+        namespace="test",
+        backend=store,
+        embed_batch_size=4,
+        upsert_batch_size=4,
+        stop_when=lambda: True,
+    )
+    ids, _ = run(ingestion)
+    assert ingestion.stopped_early
+    assert ids == []
+    assert stored_chunks(store) == {}
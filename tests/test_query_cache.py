@@ -0,0 +1,59 @@
+import asyncio
+
+import numpy as np
+
+from tools import search
+from utils.query_cache import QueryResultCache
+
+
+class CountingEmbed:
+    def __init__(self, vectors: dict[str, list[float]]):
+        self.vectors = vectors
+        self.queries: list[str] = []
+
+    def __call__(self, text: str) -> np.ndarray:
+        self.queries.append(text)
+        return np.asarray(self.vectors[text], dtype=np.float32)
+
+
+def test_exact_hit_matches_the_normalized_query_without_embedding():
+    cache = QueryResultCache(semantic_threshold=0.9)
+    embed = CountingEmbed({"Cá chép": [1, 0]})
+    cache.put("Cá chép", 5, ["kết quả"], embed=embed)
+    assert cache.get("  cá CHÉP ", 5, embed=embed) == ["kết quả"]
+    assert cache.get("cá chép", 3, embed=embed) is None
+    # Cached results of another limit are no candidates, nothing to embed for
+    assert embed.queries == ["Cá chép"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_semantic_hit_needs_the_threshold():
+    cache = QueryResultCache(semantic_threshold=0.9)
+    embed = CountingEmbed(
+        {"cá chép": [1, 0], "nuôi cá chép": [0.95, 0.05], "cá rô": [0.5, 0.5]}
+    )
+    cache.put("cá chép", 5, ["kết quả"], embed=embed)
+    assert cache.get("nuôi cá chép", 5, embed=embed) == ["kết quả"]
+    assert cache.get("cá rô", 5, embed=embed) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_entries_expire_and_are_bounded():
+    cache = QueryResultCache(ttl=0, max_entries=2)
+    cache.put("một", 5, [1])
+    assert cache.get("một", 5) is None
+    cache = QueryResultCache(max_entries=2)
+    for query in ["một", "hai", "ba"]:
+        cache.put(query, 5, [query])
+    assert cache.get("một", 5) is None
+    assert cache.get("ba", 5) == ["ba"]
+
+
+def test_search_cache_hit_does_not_load_the_embedder(monkeypatch):
+    def get_embedder():
+        raise AssertionError("the embedder was loaded")
+
+    monkeypatch.setattr(search, "get_embedder", get_embedder)
+    monkeypatch.setattr(search, "query_cache", QueryResultCache())
+    search.query_cache.put("cá chép", 5, ["kết quả"])
+    assert asyncio.run(search.search("Cá chép", 5)) == ["kết quả"]
@@ -0,0 +1,24 @@
+import ast
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Run as their own process or from a terminal, not behind a stdio MCP server
+OWN_STDOUT = {"utils/embed_service.py"}
+
+
+def test_request_path_prints_to_stderr():
+    # stdout carries the MCP protocol of the stdio tool servers
+    offending = []
+    for path in sorted([*ROOT.glob("tools/*.py"), *ROOT.glob("utils/*.py")]):
+        name = path.relative_to(ROOT).as_posix()
+        if name in OWN_STDOUT:
+            continue
+        for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+            if (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Name)
+                and node.func.id == "print"
+                and not any(keyword.arg == "file" for keyword in node.keywords)
+            ):
+                offending.append(f"{name}:{node.lineno}")
+    assert offending == []
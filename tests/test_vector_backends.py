@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+
+from utils import vector_backends
+from utils.vector_backends import NumpyBackend
+
+
+def points(start: int, count: int, source: str = "a.html"):
+    ids = [f"id-{i}" for i in range(start, start + count)]
+    vectors = np.random.default_rng(start).random((count, 4)).astype(np.float32)
+    payloads = [
+        {"text": f"đoạn {i}", "source": source, "namespace": "ns", "ingested_at": i}
+        for i in range(start, start + count)
+    ]
+    return ids, vectors, payloads
+
+
+def test_reload_replays_writes_after_the_snapshot(tmp_path):
+    backend = NumpyBackend(4, persist_dir=str(tmp_path))
+    backend.upsert(*points(0, 3))
+    backend.close()
+    backend.upsert(*points(3, 2, source="b.html"))
+    backend.delete(sources=["a.html"], ingested_before=2)
+    query = points(4, 1)[1][0]
+    expected = backend.search(query, 5)
+
+    reloaded = NumpyBackend(4, persist_dir=str(tmp_path))
+    assert len(reloaded) == 3
+    assert reloaded.search(query, 5) == expected
+
+
+def test_upsert_appends_without_rewriting_the_snapshot(tmp_path):
+    backend = NumpyBackend(4, persist_dir=str(tmp_path))
+    backend.upsert(*points(0, 10))
+    backend.close()
+    snapshot = tmp_path / "snapshot.npz"
+    written = snapshot.stat().st_mtime_ns
+    for start in range(10, 20):
+        backend.upsert(*points(start, 1))
+    assert snapshot.stat().st_mtime_ns == written
+    assert len(NumpyBackend(4, persist_dir=str(tmp_path))) == 20
+
+
+def test_snapshot_once_the_log_outgrows_it(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_backends, "SNAPSHOT_MIN_LOG_BYTES", 0)
+    backend = NumpyBackend(4, persist_dir=str(tmp_path))
+    for start in range(0, 50, 5):
+        backend.upsert(*points(start, 5))
+    logs = [name for name in os.listdir(tmp_path) if name.startswith("log.")]
+    assert len(logs) == 1
+    assert backend._generation > 1
+    assert len(NumpyBackend(4, persist_dir=str(tmp_path))) == 50
+
+
+def test_partly_written_entry_is_dropped(tmp_path):
+    backend = NumpyBackend(4, persist_dir=str(tmp_path))
+    backend.upsert(*points(0, 2))
+    log = tmp_path / "log.0.jsonl"
+    with open(log, "a") as f:
+        f.write('{"op": "upsert", "ids": ["id-2"')
+
+    reloaded = NumpyBackend(4, persist_dir=str(tmp_path))
+    assert len(reloaded) == 2
+    reloaded.upsert(*points(2, 1))
+    assert len(NumpyBackend(4, persist_dir=str(tmp_path))) == 3
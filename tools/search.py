@@ -1,78 +1,250 @@
+import asyncio
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 current_dir = os.path.dirname(__file__)
 project_root = os.path.abspath(os.path.join(current_dir, ".."))
 sys.path.append(project_root)
 
+import numpy as np
 from mcp.server.fastmcp import FastMCP
-from torch import Tensor
 
-from utils import (
-    get_html_from_url,
-    get_title_n_content_from_html,
-    process_text,
-    search_google,
+from utils.dedup import ChunkDeduplicator
+from utils.early_exit import StableAnswerSet
+from utils.parse_pool import (
+    PARSE_PROCESSES,
+    get_parse_pool,
+    init_parser,
+    parse_page,
+    shutdown_parse_pool,
 )
-from utils.chunking import recursive_chunking
+from utils.pipeline import PARSE_WORKERS, IngestionPipeline
+from utils.query_cache import QueryResultCache
+from utils.search_providers import get_search_provider
 from utils.vector_store import (
-    add_text_to_qdrant,
-    delete_data_in_collection,
-    embed_model,
+    SHARED_NAMESPACE,
+    close_backend,
+    close_embed_model,
+    delete_expired,
+    delete_namespace,
+    get_embed_model,
+    get_embedder,
+    indexed_sources,
+    new_namespace,
     search_similar_texts,
+    warm_up,
 )
 
 mcp = FastMCP(name="SearchService")
 
+# Seconds indexed pages are kept for reuse by later queries.
+# 0 indexes every request in its own namespace and drops it afterwards.
+RETENTION_TTL = 3600
+# Load the embedding model in the background as soon as the server starts
+# instead of on the first search call.
+WARM_UP = os.getenv("SEARCH_WARM_UP", "1") == "1"
+# Results of recent queries are reused for the same normalized query. Opt-in:
+# a query whose embedding is at least this close to a cached query's reuses
+# its result too. Queries a word apart ("hôm nay" / "hôm qua") can pass 0.95.
+SEMANTIC_CACHE_THRESHOLD: float | None = (
+    float(os.environ["SEMANTIC_CACHE_THRESHOLD"])
+    if os.getenv("SEMANTIC_CACHE_THRESHOLD")
+    else None
+)
+query_cache = QueryResultCache(semantic_threshold=SEMANTIC_CACHE_THRESHOLD)
+# Search results whose title and snippet are less similar to the query than
+# this are not fetched, and at most MAX_PAGES of the best ones are
+TITLE_SIMILARITY_THRESHOLD = 0.3
+MAX_PAGES = 5
+# Search results considered per query, over at most SEARCH_MAX_PAGES pages
+MAX_RESULTS = 10
+search_provider = get_search_provider()
+# Pages a running search is ingesting into the shared namespace, resolved once
+# its pipeline is done. Concurrent searches of this process selecting the same
+# page wait for it instead of storing a second copy.
+_ingesting: dict[str, asyncio.Future] = {}
+# Query the index while pages stream in and stop ingesting once `limit` chunks
+# above the threshold stay the same across two checks
+EARLY_EXIT = os.getenv("SEARCH_EARLY_EXIT", "1") == "1"
+
+
+def select_results(
+    query: str,
+    results: list,
+    threshold: float = TITLE_SIMILARITY_THRESHOLD,
+    max_pages: int = MAX_PAGES,
+) -> list[str]:
+    """Return the urls of the results worth fetching, best first.
+
+    The query and the title + snippet of every result are embedded in one
+    batch and compared with a single matrix product. Results below
+    `threshold` are dropped before anything is downloaded. Results without
+    a title or snippet cannot be judged and only fill the remaining slots.
+    """
+    urls, texts = [], []
+    for result in results:
+        url = result if isinstance(result, str) else result.url
+        if not url or url in urls:
+            continue
+        urls.append(url)
+        parts = [] if isinstance(result, str) else [result.title, result.description]
+        texts.append(" ".join(part for part in parts if part))
 
-def drop_content_if_title_not_matching(
-    query_embed: Tensor, title: str | None, similarity_threshold: float = 0.5
-):
-    if title is None:
-        return False
-    assert query_embed.shape == (768,)
+    judged = [i for i, text in enumerate(texts) if text]
+    unjudged = [i for i, text in enumerate(texts) if not text]
+    selected = []
+    if judged:
+        vectors = get_embedder().encode([query] + [texts[i] for i in judged])
+        vectors = vectors / np.maximum(
+            np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12
+        )
+        scores = vectors[1:] @ vectors[0]
+        order = np.argsort(-scores)
+        selected = [judged[i] for i in order if scores[i] >= threshold]
+        print(
+            f"Title prefilter: {len(selected)}/{len(judged)} result(s) "
+            f"above {threshold}",
+            file=sys.stderr,
+        )
+    selected = (selected + unjudged)[:max_pages]
+    return [urls[i] for i in selected]
 
-    title_embed = embed_model.encode(title)
-    similarity = embed_model.similarity(query_embed, title_embed)
-    if similarity <= similarity_threshold:
-        return False
-    return True
+
+def prepare_parser() -> tuple[ProcessPoolExecutor | None, int]:
+    """Return the executor `parse_page` runs in (None for the pipeline's
+    threads) and how many parses to keep in flight."""
+    embed_model = get_embed_model()
+    # Room left in the model window once [CLS] and [SEP] are added
+    max_tokens = embed_model.max_seq_length - 2
+    if PARSE_PROCESSES > 0:
+        # Workers load their own tokenizer once and are reused across queries,
+        # and there are enough parses in flight to keep every one of them busy
+        parse_executor = get_parse_pool(embed_model.model_name, max_tokens)
+        return parse_executor, max(PARSE_PROCESSES, PARSE_WORKERS)
+    init_parser(embed_model.tokenizer, max_tokens)
+    return None, PARSE_WORKERS
 
 
 @mcp.tool(name="search", description="A tool to search for a query.")
-def search(query: str, limit: int = 5) -> list[str]:
+async def search(query: str, limit: int = 5) -> list[str]:
     """Search the web for the given query and return the results."""
 
-    results, last_index_search = search_google(query)
-    # query_embedding = embed_model.encode(query)
-    for result in results:
-        if not result:
-            continue
-        if not isinstance(result, str):
-            result = result.url
-        try:
-            html = get_html_from_url(result if isinstance(result, str) else result)
-            title, contents = get_title_n_content_from_html(html)
-            # if drop_content_if_title_not_matching(query_embedding, title):
-            #     continue
-            chunks = recursive_chunking(
-                process_text(contents),
-                int(embed_model.max_seq_length * 0.8),
-                10,
+    # Embedding the query and searching the index would block the event loop
+    # that other requests, and other tools of the gateway, are served from.
+    # So would loading the model, or waiting for warm-up to finish loading it.
+    # The cache only embeds the query when it has no exact hit, so the model is
+    # not even loaded for one.
+    def embed(text: str) -> np.ndarray:
+        return get_embedder().encode(text)
+
+    context = await asyncio.to_thread(query_cache.get, query, limit, embed=embed)
+    if context is not None:
+        print(f"Query cache hit: {query_cache.stats()}", file=sys.stderr)
+        return context
+    context = await search_uncached(query, limit)
+    if context:
+        await asyncio.to_thread(query_cache.put, query, limit, context, embed=embed)
+    return context
+
+
+async def search_uncached(query: str, limit: int) -> list[str]:
+    if RETENTION_TTL > 0:
+        namespace = SHARED_NAMESPACE
+        await asyncio.to_thread(delete_expired, RETENTION_TTL)
+    else:
+        namespace = new_namespace()
+    # Every selected url, whether it is indexed now or was already
+    urls: list[str] = []
+    # Urls this search ingests, and ingests of other searches it waits for
+    owned: list[str] = []
+    awaited: list[asyncio.Future] = []
+
+    async def urls_to_index():
+        """Stream the selected urls of every result page as soon as it comes."""
+        async for hits in search_provider.search_pages(query, max_results=MAX_RESULTS):
+            # Unrelated pages are never downloaded, let alone chunked and embedded
+            selected = await asyncio.to_thread(
+                select_results, query, hits, max_pages=MAX_PAGES - len(urls)
             )
+            selected = [url for url in selected if url not in urls]
+            urls.extend(selected)
+            cached = set()
+            if RETENTION_TTL > 0:
+                cached = await asyncio.to_thread(
+                    indexed_sources, selected, RETENTION_TTL
+                )
+                print(f"Reusing {len(cached)} already indexed page(s)", file=sys.stderr)
+            for url in selected:
+                if url in cached:
+                    continue
+                if RETENTION_TTL > 0:
+                    if url in _ingesting:
+                        awaited.append(_ingesting[url])
+                        continue
+                    _ingesting[url] = asyncio.get_running_loop().create_future()
+                    owned.append(url)
+                yield url
+            if len(urls) >= MAX_PAGES:
+                return
 
-            for chunk in chunks:
-                add_text_to_qdrant(
-                    chunk, title, result if isinstance(result, str) else result
+    parse_executor, parse_workers = await asyncio.to_thread(prepare_parser)
+    # Overlapping windows and mirrored articles are found before any model
+    # work. A page of the shared namespace must be stored whole, as later
+    # queries may reuse it without the page it mirrors, so there a mirrored
+    # chunk is kept but stored with the vector of the chunk it mirrors.
+    deduplicator = ChunkDeduplicator(keep_pages_whole=RETENTION_TTL > 0)
+
+    # Already indexed sources count too, they may answer the query by themselves
+    answer_set = StableAnswerSet(query, limit, namespace, sources=urls)
+
+    # Pages are downloaded, parsed, embedded and stored as overlapping stages
+    pipeline = IngestionPipeline(
+        parse_page,
+        namespace=namespace,
+        parse_executor=parse_executor,
+        parse_workers=parse_workers,
+        embed_text=deduplicator.embed_text,
+        stop_when=answer_set if EARLY_EXIT else None,
+    )
+    try:
+        try:
+            _, metrics = await pipeline.run(urls_to_index())
+            for stage in metrics:
+                print(f"Pipeline stage: {stage}", file=sys.stderr)
+            if pipeline.stopped_early:
+                print(
+                    f"Answer set stable after {answer_set.checks} check(s)",
+                    file=sys.stderr,
                 )
-                print(f"Adding chunk: {chunk[:50]}...")
         except Exception as e:
-            # pass
-            print(f"Error processing {result}: {e}")
-    context = search_similar_texts(query, limit)
-    delete_data_in_collection()
-    return context
+            print(f"Error in ingestion pipeline: {e}", file=sys.stderr)
+        finally:
+            for url in owned:
+                _ingesting.pop(url).set_result(None)
+        if awaited:
+            print(
+                f"Waiting for {len(awaited)} page(s) ingested by other searches",
+                file=sys.stderr,
+            )
+            await asyncio.wait(awaited, timeout=pipeline.fetch_deadline)
+        print(f"Deduplication: {deduplicator.stats()}", file=sys.stderr)
+        print(f"Embedding cache: {get_embedder().stats()}", file=sys.stderr)
+        # Restricting to this query's sources keeps shared-namespace reads isolated
+        return await asyncio.to_thread(
+            search_similar_texts, query, limit, namespace=namespace, sources=urls
+        )
+    finally:
+        if RETENTION_TTL <= 0:
+            await asyncio.to_thread(delete_namespace, namespace)
 
 
 if __name__ == "__main__":
-    mcp.run("stdio")
+    if WARM_UP:
+        warm_up()
+    try:
+        mcp.run("stdio")
+    finally:
+        shutdown_parse_pool()
+        close_embed_model()
+        close_backend()
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import sys
 
@@ -7,7 +8,7 @@ sys.path.append(project_root)
 
 from mcp.server.fastmcp import FastMCP
 
-from utils import get_html_from_url, get_title_n_content_from_html
+from utils import get_html_from_url_async, get_page_content
 
 mcp = FastMCP(name="SummarizeWebContentService")
 
@@ -15,10 +16,10 @@ mcp = FastMCP(name="SummarizeWebContentService")
 @mcp.tool()
 async def read_html(url: str) -> str:
     """Read content from an URL."""
-    html = get_html_from_url(url)
+    html = await get_html_from_url_async(url)
     if not html:
         return "Failed to fetch content."
-    _, content = get_title_n_content_from_html(html)
+    _, content = await asyncio.to_thread(get_page_content, url, html)
     return content
 
 
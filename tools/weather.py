@@ -1,8 +1,15 @@
+import os
+import sys
 from typing import Any
 
-import httpx
+current_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(project_root)
+
 from mcp.server.fastmcp import FastMCP
 
+from utils.get_html import get_async_client
+
 mcp = FastMCP(name="WeatherService")
 
 NWS_API_BASE = "https://api.weather.gov"
@@ -12,13 +19,13 @@ USER_AGENT = "weather-app/1.0"
 async def make_nws_request(url: str) -> dict[str, Any] | None:
     """Make a request to the NWS API with proper error handling."""
     headers = {"User-Agent": USER_AGENT, "Accept": "application/geo+json"}
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception:
-            return None
+    # The shared client keeps connections to the API alive between calls
+    try:
+        response = await get_async_client().get(url, headers=headers, timeout=30.0)
+        response.raise_for_status()
+        return response.json()
+    except Exception:
+        return None
 
 
 def format_alert(feature: dict) -> str:
@@ -48,7 +55,7 @@ async def get_alerts(state: str) -> str:
     Args:
         state: Two-letter US state code (e.g. CA, NY)
     """
-    print(f"Calling from get_alerts with state: {state}")
+    print(f"Calling from get_alerts with state: {state}", file=sys.stderr)
     url = f"{NWS_API_BASE}/alerts/active/area/{state}"
     data = await make_nws_request(url)
 
@@ -71,7 +78,10 @@ async def get_forecast(latitude: float, longitude: float) -> str:
         longitude: Longitude of the location
     """
 
-    print(f"Calling from get_forecast with latitude: {latitude}, logitude: {longitude}")
+    print(
+        f"Calling from get_forecast with latitude: {latitude}, logitude: {longitude}",
+        file=sys.stderr,
+    )
     # First get the forecast grid endpoint
     points_url = f"{NWS_API_BASE}/points/{latitude},{longitude}"
     points_data = await make_nws_request(points_url)
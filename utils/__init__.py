@@ -1,3 +1,9 @@
-from .get_html import get_html_from_url, get_title_n_content_from_html
+from .get_html import (
+    get_html_from_url,
+    get_html_from_url_async,
+    get_page_content,
+    get_title_n_content_from_html,
+)
+from .html_extract import extract_main_content
 from .search_google import search_google
 from .text_preprocessing import process_text
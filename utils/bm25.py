@@ -0,0 +1,166 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+from utils.embed_cache import normalize_text
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Constant of reciprocal rank fusion, damps the weight of the very first ranks
+RRF_K = 60
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased words, Vietnamese syllables count as words."""
+    return _TOKEN_PATTERN.findall(normalize_text(text).lower())
+
+
+class BM25Index:
+    """Okapi BM25 over a growing set of documents.
+
+    Term frequencies are kept as three flat arrays of (document, term,
+    frequency) entries, so a query is scored with a handful of vectorized
+    operations over the entries of its terms instead of a Python loop over
+    documents. Collection statistics (document frequencies, average length)
+    are computed over the documents selected by `mask`, i.e. the per-query
+    corpus rather than everything ever indexed.
+
+    The arrays have spare capacity that doubles when full, like the rows of
+    `NumpyBackend`, so adding documents only copies the new entries.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B) -> None:
+        self.k1 = k1
+        self.b = b
+        self.vocabulary: dict[str, int] = {}
+        self._entries = {
+            "docs": np.empty(0, dtype=np.int64),
+            "terms": np.empty(0, dtype=np.int64),
+            "frequencies": np.empty(0, dtype=np.float32),
+        }
+        self._entry_count = 0
+        self._all_lengths = np.empty(0, dtype=np.float32)
+        self._doc_count = 0
+
+    def __len__(self) -> int:
+        return self._doc_count
+
+    @property
+    def _docs(self) -> np.ndarray:
+        return self._entries["docs"][: self._entry_count]
+
+    @property
+    def _terms(self) -> np.ndarray:
+        return self._entries["terms"][: self._entry_count]
+
+    @property
+    def _frequencies(self) -> np.ndarray:
+        return self._entries["frequencies"][: self._entry_count]
+
+    @property
+    def _lengths(self) -> np.ndarray:
+        return self._all_lengths[: self._doc_count]
+
+    @staticmethod
+    def _grown(array: np.ndarray, used: int, size: int) -> np.ndarray:
+        """`array` with room for `size` values, the first `used` kept."""
+        if size <= len(array):
+            return array
+        grown = np.empty(max(size, 2 * len(array), 256), dtype=array.dtype)
+        grown[:used] = array[:used]
+        return grown
+
+    def add(self, texts: list[str]):
+        docs, terms, frequencies, lengths = [], [], [], []
+        for offset, text in enumerate(texts):
+            tokens = tokenize(text)
+            counts = Counter(tokens)
+            docs.extend([len(self) + offset] * len(counts))
+            terms.extend(
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+                for token in counts
+            )
+            frequencies.extend(counts.values())
+            lengths.append(len(tokens))
+        size = self._entry_count + len(docs)
+        for name, values in (
+            ("docs", docs),
+            ("terms", terms),
+            ("frequencies", frequencies),
+        ):
+            array = self._grown(self._entries[name], self._entry_count, size)
+            array[self._entry_count : size] = values
+            self._entries[name] = array
+        self._entry_count = size
+        size = self._doc_count + len(lengths)
+        self._all_lengths = self._grown(self._all_lengths, self._doc_count, size)
+        self._all_lengths[self._doc_count : size] = lengths
+        self._doc_count = size
+
+    def keep(self, mask: np.ndarray):
+        """Drop the documents where `mask` is False, renumbering the others."""
+        entries = mask[self._docs]
+        new_index = np.cumsum(mask) - 1
+        kept = int(entries.sum())
+        self._entries["docs"][:kept] = new_index[self._docs[entries]]
+        self._entries["terms"][:kept] = self._terms[entries]
+        self._entries["frequencies"][:kept] = self._frequencies[entries]
+        self._entry_count = kept
+        docs = int(mask.sum())
+        self._all_lengths[:docs] = self._lengths[mask]
+        self._doc_count = docs
+
+    def scores(self, query: str, mask: np.ndarray | None = None) -> np.ndarray:
+        """BM25 score of every document for `query`, 0 outside of `mask`."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        if mask is None:
+            mask = np.ones(len(self), dtype=bool)
+        query_terms = np.unique(
+            [self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary]
+        ).astype(np.int64)
+        n_docs = int(mask.sum())
+        if not len(query_terms) or not n_docs:
+            return scores
+
+        entries = np.isin(self._terms, query_terms) & mask[self._docs]
+        docs = self._docs[entries]
+        terms = np.searchsorted(query_terms, self._terms[entries])
+        frequencies = self._frequencies[entries]
+
+        document_frequencies = np.bincount(terms, minlength=len(query_terms))
+        idf = np.log1p(
+            (n_docs - document_frequencies + 0.5) / (document_frequencies + 0.5)
+        )
+        average_length = max(float(self._lengths[mask].mean()), 1.0)
+        norms = self.k1 * (1 - self.b + self.b * self._lengths[docs] / average_length)
+        weights = idf[terms] * frequencies * (self.k1 + 1) / (frequencies + norms)
+        scores += np.bincount(docs, weights=weights, minlength=len(self)).astype(
+            np.float32
+        )
+        return scores
+
+    def search(
+        self, query: str, limit: int, mask: np.ndarray | None = None
+    ) -> list[tuple[int, float]]:
+        """Return up to `limit` (document index, score) with a positive score."""
+        scores = self.scores(query, mask)
+        matching = np.flatnonzero(scores > 0)
+        if limit <= 0 or not len(matching):
+            return []
+        if limit < len(matching):
+            top = np.argpartition(-scores[matching], limit - 1)[:limit]
+            matching = matching[top]
+        matching = matching[np.argsort(-scores[matching])]
+        return [(int(i), float(scores[i])) for i in matching]
+
+
+def reciprocal_rank_fusion(rankings: list[list], k: int = RRF_K) -> dict:
+    """Fuse ranked lists of ids, an id scores the sum of 1 / (k + rank)."""
+    fused: dict = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (k + rank)
+    return dict(sorted(fused.items(), key=lambda item: item[1], reverse=True))
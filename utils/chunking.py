@@ -1,3 +1,8 @@
+import re
+from typing import Iterator
+
+import numpy as np
+
 # def recursive_chunking(text : str, max_chunk_size: int, overlap_sentences : int) -> list[str]:
 #     if not text:
 #         return []
@@ -45,4 +50,87 @@ def recursive_chunking(
                 chunking_text[-2][-(max_chunk_size - overlap_sentences) :] + chunking_text[-1]
             )
             chunking_text.pop()
-        return [" ".join(chunk) for chunk in chunking_text]
\ No newline at end of file
+        return [" ".join(chunk) for chunk in chunking_text]
+
+# Sentence ends: terminal punctuation followed by whitespace, or a line break
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])\s+|\s*\n\s*")
+
+
+def _sentence_spans(text: str) -> tuple[np.ndarray, np.ndarray]:
+    """Return the (start, end) character offsets of the sentences of `text`."""
+    starts, ends = [0], []
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        ends.append(match.start())
+        starts.append(match.end())
+    ends.append(len(text))
+    spans = np.array([starts, ends], dtype=np.int64)
+    return spans[:, spans[1] > spans[0]]  # type: ignore
+
+
+def iter_token_chunks(
+    text: str, tokenizer, max_tokens: int, overlap_sentences: int = 1
+) -> Iterator[str]:
+    """Yield chunks of whole sentences holding at most `max_tokens` tokens.
+
+    The text is tokenized once and the token offsets are used to count the
+    tokens of every sentence. Chunk boundaries are then found with a cumulative
+    sum and `searchsorted` rather than by re-tokenizing candidate chunks.
+    Consecutive chunks share `overlap_sentences` sentences. A sentence longer
+    than `max_tokens` is cut at token boundaries.
+
+    Args:
+        text: The text to split.
+        tokenizer: A fast (offset mapping capable) Hugging Face tokenizer,
+            usually `EmbedModel.tokenizer`.
+        max_tokens: Token budget of a chunk, without the special tokens.
+        overlap_sentences: Sentences repeated at the start of the next chunk.
+    """
+    if not text.strip():
+        return
+    encoding = tokenizer(
+        text,
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        verbose=False,
+    )
+    offsets = np.asarray(encoding["offset_mapping"], dtype=np.int64).reshape(-1, 2)
+    if not len(offsets):
+        return
+    sentence_starts, sentence_ends = _sentence_spans(text)
+    # Index of the first token of every sentence, and tokens per sentence
+    first_tokens = np.searchsorted(offsets[:, 1], sentence_starts, side="right")
+    counts = np.diff(np.append(first_tokens, len(offsets)))
+    cumulative = np.cumsum(counts)
+
+    n_sentences = len(counts)
+    start = 0
+    last_end = 0
+    while start < n_sentences:
+        if counts[start] > max_tokens:
+            first = first_tokens[start]
+            for t in range(first, first + counts[start], max_tokens):
+                window = offsets[t : min(t + max_tokens, first + counts[start])]
+                yield text[window[0, 0] : window[-1, 1]].strip()
+            start = last_end = start + 1
+            continue
+
+        base = cumulative[start - 1] if start else 0
+        end = int(np.searchsorted(cumulative, base + max_tokens, side="right"))
+        if end <= last_end:
+            # The overlap left no room for a new sentence, restart without it
+            start = last_end
+            continue
+        chunk = text[sentence_starts[start] : sentence_ends[end - 1]].strip()
+        if chunk:
+            yield chunk
+        if end >= n_sentences:
+            return
+        last_end = end
+        start = max(end - overlap_sentences, start + 1)
+
+
+def token_chunking(
+    text: str, tokenizer, max_tokens: int, overlap_sentences: int = 1
+) -> list[str]:
+    """List version of `iter_token_chunks`."""
+    return list(iter_token_chunks(text, tokenizer, max_tokens, overlap_sentences))
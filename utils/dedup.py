@@ -0,0 +1,147 @@
+import re
+import threading
+import zlib
+
+import numpy as np
+
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16  # 16 bands of 4 rows: pairs above ~0.5 Jaccard become candidates
+SHINGLE_SIZE = 3
+DUPLICATE_THRESHOLD = 0.8
+
+# Largest prime below 2^32: a * h + b with a, b, h < 2^32 never overflows 64 bits
+_PRIME = 4_294_967_291
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+class ChunkDeduplicator:
+    """Drops near-duplicate chunks before they reach the embedding model.
+
+    Every chunk gets a MinHash signature over its word shingles. An LSH index
+    of signature bands finds candidate duplicates among the chunks kept so
+    far, and a candidate whose estimated Jaccard similarity reaches
+    `threshold` is a duplicate. One instance is meant to live for one query
+    and may be shared by the threads parsing its pages.
+
+    With `keep_pages_whole`, a duplicate of another page's chunk (a mirrored
+    or syndicated article) is not dropped but shares that chunk's vector, see
+    `embed_text`: every page is then stored whole, as a page of a shared
+    namespace must be, yet embedded only once.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DUPLICATE_THRESHOLD,
+        num_permutations: int = NUM_PERMUTATIONS,
+        bands: int = LSH_BANDS,
+        shingle_size: int = SHINGLE_SIZE,
+        seed: int = 1,
+        keep_pages_whole: bool = False,
+    ) -> None:
+        assert num_permutations % bands == 0, "bands must divide num_permutations"
+        self.threshold = threshold
+        self.keep_pages_whole = keep_pages_whole
+        self.bands = bands
+        self.rows = num_permutations // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, num_permutations, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, num_permutations, dtype=np.uint64)
+        self._buckets: list[dict[bytes, list[int]]] = [{} for _ in range(bands)]
+        self._signatures: list[np.ndarray] = []
+        # Text and page of every remembered chunk, by signature index
+        self._chunks: list[tuple[str, str | None]] = []
+        self._lock = threading.Lock()
+        self.seen = 0
+        self.dropped = 0
+        self.dropped_chars = 0
+        self.shared = 0
+
+    def _signature(self, text: str) -> np.ndarray:
+        words = _WORD_PATTERN.findall(text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {
+            " ".join(words[i : i + size]) for i in range(max(len(words) - size + 1, 1))
+        }
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode()) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        # (a * h + b) mod p for every permutation and shingle at once
+        prime = np.uint64(_PRIME)
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % prime
+        return permuted.min(axis=1)
+
+    def find(
+        self, text: str, page: str | None = None
+    ) -> tuple[str, str | None] | None:
+        """Return the (text, page) of a chunk seen before that `text` nearly
+        duplicates, else remember `text` as a chunk of `page` and return None.
+        """
+        signature = self._signature(text)
+        band_keys = [
+            signature[i * self.rows : (i + 1) * self.rows].tobytes()
+            for i in range(self.bands)
+        ]
+        with self._lock:
+            self.seen += 1
+            candidates = {
+                index
+                for band, key in zip(self._buckets, band_keys)
+                for index in band.get(key, ())
+            }
+            for index in sorted(candidates):
+                similarity = np.mean(self._signatures[index] == signature)
+                if similarity >= self.threshold:
+                    return self._chunks[index]
+
+            index = len(self._signatures)
+            self._signatures.append(signature)
+            self._chunks.append((text, page))
+            for band, key in zip(self._buckets, band_keys):
+                band.setdefault(key, []).append(index)
+            return None
+
+    def is_duplicate(self, text: str) -> bool:
+        """Return True if `text` nearly duplicates a chunk seen before, else
+        remember it and return False."""
+        if self.find(text) is None:
+            return False
+        with self._lock:
+            self.dropped += 1
+            self.dropped_chars += len(text)
+        return True
+
+    def embed_text(self, text: str, page: str) -> str | None:
+        """Return the text to embed for chunk `text` of `page`: `text` itself
+        when it is new, None to drop it when it duplicates a chunk seen
+        before. With `keep_pages_whole`, a duplicate of another page's chunk
+        returns that chunk's text instead, whose vector it is stored with.
+        """
+        duplicate = self.find(text, page)
+        if duplicate is None:
+            return text
+        original, original_page = duplicate
+        with self._lock:
+            if self.keep_pages_whole and original_page != page:
+                self.shared += 1
+                return original
+            self.dropped += 1
+            self.dropped_chars += len(text)
+            return None
+
+    def filter(self, texts: list[str]) -> list[str]:
+        return [text for text in texts if not self.is_duplicate(text)]
+
+    def stats(self) -> dict:
+        return {
+            "seen": self.seen,
+            "dropped": self.dropped,
+            "dropped_chars": self.dropped_chars,
+            "shared": self.shared,
+            # Chunks the model does not run on, dropped or sharing a vector
+            "saved_ratio": (
+                (self.dropped + self.shared) / self.seen if self.seen else 0.0
+            ),
+        }
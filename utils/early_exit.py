@@ -0,0 +1,54 @@
+from utils.vector_store import search_similar_texts
+
+# Consecutive checks that must return the same answer set to stop ingesting
+STABLE_CHECKS = 2
+
+
+class StableAnswerSet:
+    """Tells an ingestion pipeline when the answer to a query is good enough.
+
+    Every call queries the index as it is so far. Once `limit` chunks score
+    above `threshold` and the same chunks come back in `stable_checks`
+    consecutive calls, further pages are unlikely to change the answer and
+    the call returns True. The check is a dense-only search without
+    reranking, cheap enough to run after every upsert.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        limit: int,
+        namespace: str | None = None,
+        sources: list[str] | None = None,
+        threshold: float = 0.5,
+        stable_checks: int = STABLE_CHECKS,
+    ) -> None:
+        self.query = query
+        self.limit = limit
+        self.namespace = namespace
+        # May keep growing while pages are streamed in, read on every check
+        self.sources = sources
+        self.threshold = threshold
+        self.stable_checks = stable_checks
+        self.checks = 0
+        self._answer: frozenset[str] | None = None
+        self._stable = 0
+
+    def __call__(self) -> bool:
+        self.checks += 1
+        results = search_similar_texts(
+            self.query,
+            self.limit,
+            namespace=self.namespace,
+            sources=list(self.sources) if self.sources is not None else None,
+            threshold=self.threshold,
+            hybrid=False,
+            rerank=False,
+        )
+        if len(results) < self.limit:
+            self._answer, self._stable = None, 0
+            return False
+        answer = frozenset(result["id"] for result in results)
+        self._stable = self._stable + 1 if answer == self._answer else 1
+        self._answer = answer
+        return self._stable >= self.stable_checks
@@ -0,0 +1,211 @@
+import hashlib
+import os
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: the cache is then only safe within one process
+    fcntl = None
+
+if TYPE_CHECKING:
+    from utils.embed_model import EmbedModel
+    from utils.embed_service import RemoteEmbedModel
+
+EMBED_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "mcp_hub", "embeddings"
+)
+EMBED_CACHE_MAX_ENTRIES = 50_000
+# Rows a given text may be stored in, the least recently used one is replaced
+EMBED_CACHE_WAYS = 8
+# Options of `encode` that do not change the vectors, left out of the key
+_NEUTRAL_KWARGS = {"show_progress_bar", "convert_to_numpy", "device"}
+_KEY_SIZE = 20  # sha1 digest
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so that trivially different copies share a cache key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """Disk-backed embedding cache wrapped around an `EmbedModel`.
+
+    Vectors live in a memory-mapped matrix of `max_entries` rows, keyed by the
+    hash of the model name, the encode options and the normalized text. The
+    matrix may be shared by several processes, so there is no in-memory index
+    to get out of sync: a key can only live in the `ways` rows of the set its
+    hash selects, every row stores the key it holds next to its vector, and a
+    read only counts when the stored key matches before and after copying the
+    vector. When a set is full its least recently used row is reused.
+
+    Writers hold an exclusive `flock` on the cache's lock file, so two
+    processes storing into the same set never pick the same row. Creating the
+    files happens under the same lock, and the directory is named after the
+    number of rows, so a file another process has mapped is never resized.
+    """
+
+    def __init__(
+        self,
+        model: "EmbedModel | RemoteEmbedModel",
+        cache_dir: str = EMBED_CACHE_DIR,
+        max_entries: int = EMBED_CACHE_MAX_ENTRIES,
+        dtype: str = "float32",
+        ways: int = EMBED_CACHE_WAYS,
+    ) -> None:
+        assert dtype in ("float32", "float16"), "dtype must be float32 or float16"
+        self.model = model
+        self.model_name = model.model_id
+        self.ways = ways
+        self.sets = max(max_entries // ways, 1)
+        self.max_entries = self.sets * ways
+        self.dtype = np.dtype(dtype)
+        self.dim = model.get_sentence_embedding_dimension()
+        assert isinstance(self.dim, int)
+        self.hits = 0
+        self.misses = 0
+
+        safe_name = self.model_name.replace("/", "__").replace(":", "_")
+        self.path = os.path.join(
+            cache_dir, f"{safe_name}.{dtype}.{self.max_entries}"
+        )
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._lock_file = open(os.path.join(self.path, "lock"), "a+b")
+        self._vectors, self._keys, self._used = self._open()
+
+    @contextmanager
+    def _exclusive(self):
+        """Hold the cache's lock against the writers of every process."""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _open(self) -> tuple[np.memmap, np.memmap, np.memmap]:
+        files = {
+            "vectors.bin": (self.dtype, (self.max_entries, self.dim)),
+            "keys.bin": (np.dtype(np.uint8), (self.max_entries, _KEY_SIZE)),
+            "used.bin": (np.dtype(np.float64), (self.max_entries,)),
+        }
+        with self._exclusive():
+            for name, (dtype, shape) in files.items():
+                path = os.path.join(self.path, name)
+                size = int(dtype.itemsize * np.prod(shape))
+                if os.path.exists(path) and os.path.getsize(path) == size:
+                    continue
+                # Only left by a crash while creating it: replaced by a new
+                # zeroed file, whoever still maps the old one keeps it intact
+                with open(f"{path}.tmp", "wb") as f:
+                    f.truncate(size)
+                os.replace(f"{path}.tmp", path)
+            return tuple(  # type: ignore
+                np.memmap(
+                    os.path.join(self.path, name), dtype=dtype, mode="r+", shape=shape
+                )
+                for name, (dtype, shape) in files.items()
+            )
+
+    def flush(self) -> None:
+        """Write the memory-mapped rows back to disk."""
+        with self._lock:
+            self._vectors.flush()
+            self._keys.flush()
+            self._used.flush()
+
+    def key(self, text: str, **kwargs) -> bytes:
+        options = sorted(
+            (name, repr(value))
+            for name, value in kwargs.items()
+            if name not in _NEUTRAL_KWARGS
+        )
+        data = f"{self.model_name}\0{options}\0{normalize_text(text)}".encode()
+        return hashlib.sha1(data).digest()
+
+    def _rows(self, key: bytes) -> slice:
+        first = int.from_bytes(key[:8], "little") % self.sets * self.ways
+        return slice(first, first + self.ways)
+
+    def _lookup(self, key: bytes) -> np.ndarray | None:
+        rows = self._rows(key)
+        expected = np.frombuffer(key, dtype=np.uint8)
+        matches = np.flatnonzero((self._keys[rows] == expected).all(axis=1))
+        if not len(matches):
+            return None
+        slot = rows.start + int(matches[0])
+        vector = np.array(self._vectors[slot], dtype=np.float32)
+        # Another process may have reused the row while it was copied
+        if not np.array_equal(self._keys[slot], expected):
+            return None
+        self._used[slot] = time.time()
+        return vector
+
+    def _store(self, key: bytes, vector: np.ndarray) -> None:
+        """Write `vector` under `key`, the caller holds `_exclusive`."""
+        rows = self._rows(key)
+        expected = np.frombuffer(key, dtype=np.uint8)
+        keys = self._keys[rows]
+        matches = np.flatnonzero((keys == expected).all(axis=1))
+        empty = np.flatnonzero(~keys.any(axis=1))
+        if len(matches):
+            way = int(matches[0])
+        elif len(empty):
+            way = int(empty[0])
+        else:
+            way = int(np.argmin(self._used[rows]))  # evict least recently used
+        slot = rows.start + way
+        # Readers never see the new vector under the old key
+        self._keys[slot] = 0
+        self._vectors[slot] = vector
+        self._keys[slot] = expected
+        self._used[slot] = time.time()
+
+    def encode(self, sentences: str | list[str], batch_size: int = 32, **kwargs):
+        """Same as `EmbedModel.encode` but only runs the model on cache misses."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        keys = [self.key(text, **kwargs) for text in texts]
+        result = np.empty((len(texts), self.dim), dtype=np.float32)
+
+        missing: dict[bytes, list[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in missing or (vector := self._lookup(key)) is None:
+                    missing.setdefault(key, []).append(i)
+                    continue
+                result[i] = vector
+                self.hits += 1
+            self.misses += sum(len(positions) for positions in missing.values())
+
+        if missing:
+            positions = list(missing.values())
+            embeddings = self.model.encode(
+                [texts[p[0]] for p in positions], batch_size=batch_size, **kwargs
+            )
+            with self._lock, self._exclusive():
+                for key, p, embedding in zip(missing, positions, embeddings):
+                    result[p] = embedding
+                    self._store(key, embedding)
+        return result[0] if single else result
+
+    def similarity(self, *args, **kwargs):
+        return self.model.similarity(*args, **kwargs)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": int(self._keys.any(axis=1).sum()),
+            "max_entries": self.max_entries,
+        }
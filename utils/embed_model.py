@@ -1,13 +1,82 @@
+import os
+
+import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
 
 VI_EMDED_MODEL = "hiieu/halong_embedding"
+# "torch" (fp32), "int8" (torch dynamic quantization of the Linear layers) or
+# "onnx" (ONNX Runtime, needs `sentence-transformers[onnx]`)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+# CPU threads used for inference, 0 keeps the library default
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))
+EMBED_BACKENDS = ("torch", "int8", "onnx")
 
 
 class EmbedModel(SentenceTransformer):
-    def __init__(self, model_name: str = VI_EMDED_MODEL) -> None:
-        super().__init__(model_name)
+    def __init__(
+        self,
+        model_name: str = VI_EMDED_MODEL,
+        backend: str = EMBED_BACKEND,
+        threads: int = EMBED_THREADS,
+    ) -> None:
+        if backend not in EMBED_BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {backend}")
+        if threads > 0:
+            torch.set_num_threads(threads)
+
+        if backend == "onnx":
+            import onnxruntime
+
+            session_options = onnxruntime.SessionOptions()
+            if threads > 0:
+                session_options.intra_op_num_threads = threads
+            super().__init__(
+                model_name,
+                device="cpu",
+                backend="onnx",
+                model_kwargs={
+                    "provider": "CPUExecutionProvider",
+                    "session_options": session_options,
+                },
+            )
+        else:
+            super().__init__(model_name, device="cpu" if backend == "int8" else None)
+        if backend == "int8":
+            torch.ao.quantization.quantize_dynamic(
+                self, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+        self.model_name = model_name
+        self.backend = backend
+        # Vectors of different backends differ slightly, so caches keep them apart
+        self.model_id = model_name if backend == "torch" else f"{model_name}:{backend}"
 
     def retrieve_similarity_measure(self, text1: str, text2: str) -> float:
         embedding1 = self.encode(text1)
         embedding2 = self.encode(text2)
         return float(self.similarity(embedding1, embedding2))
+
+
+def cosine_agreement(
+    model: SentenceTransformer,
+    reference: SentenceTransformer,
+    sentences: list[str],
+    batch_size: int = 32,
+) -> dict:
+    """Compare the embeddings of `model` with those of `reference`.
+
+    Returns the mean, minimum and 5th percentile of the cosine similarity
+    between both models' embedding of every sentence. A quantized or ONNX
+    model is a safe replacement for the fp32 one when these stay close to 1.
+    """
+    candidate = model.encode(sentences, batch_size=batch_size)
+    expected = reference.encode(sentences, batch_size=batch_size)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    expected = expected / np.linalg.norm(expected, axis=1, keepdims=True)
+    cosines = np.sum(candidate * expected, axis=1)
+    return {
+        "sentences": len(sentences),
+        "mean": float(cosines.mean()),
+        "min": float(cosines.min()),
+        "p5": float(np.percentile(cosines, 5)),
+    }
@@ -0,0 +1,330 @@
+"""A single embedding model shared by every MCP server on the machine.
+
+Run the service once:
+
+    python utils/embed_service.py --socket /tmp/mcp_hub_embed.sock
+
+and start the tool servers with EMBED_SERVICE_SOCKET=/tmp/mcp_hub_embed.sock:
+`get_embed_model` then returns a `RemoteEmbedModel` instead of loading the
+model in every process. The service also owns the embedding cache, so the
+clients share its hits and never keep a cache of their own.
+
+Messages are length-prefixed frames. A request is one JSON frame, an encode
+reply is a JSON header frame followed by the raw float32 vectors.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+
+import numpy as np
+
+EMBED_SERVICE_SOCKET = os.getenv("EMBED_SERVICE_SOCKET")
+EMBED_SERVICE_MAX_BATCH = 64
+# How long the first request of a batch waits for others to join it
+EMBED_SERVICE_MAX_WAIT = 0.005  # seconds
+
+_HEADER = struct.Struct("!I")
+# Texts, encode options and the future the vectors are sent to
+_Request = tuple[list[str], dict, asyncio.Future]
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return await reader.readexactly(size)
+
+
+def _frame(data: bytes) -> bytes:
+    return _HEADER.pack(len(data)) + data
+
+
+class EmbeddingService:
+    """Serves `encode` requests of many processes with one model.
+
+    Requests arriving within `max_wait` of each other are merged into one
+    forward pass of up to `max_batch_size` texts, then split again. Only
+    requests with the same encode options are merged. With `cache`, the
+    model is wrapped in an `EmbeddingCache` and only runs on cache misses.
+    """
+
+    def __init__(
+        self,
+        model,
+        max_batch_size: int = EMBED_SERVICE_MAX_BATCH,
+        max_wait: float = EMBED_SERVICE_MAX_WAIT,
+        cache: bool = True,
+    ) -> None:
+        self.model = model
+        self.embedder = None
+        if cache:
+            from utils.embed_cache import EmbeddingCache
+
+            self.embedder = EmbeddingCache(model)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = 0
+        self.batches = 0
+        self._queue: asyncio.Queue[_Request] = asyncio.Queue()
+
+    def info(self) -> dict:
+        return {
+            "model_name": self.model.model_name,
+            "model_id": self.model.model_id,
+            "dim": self.model.get_sentence_embedding_dimension(),
+            "max_seq_length": self.model.max_seq_length,
+            "requests": self.requests,
+            "batches": self.batches,
+            "cache": self.embedder.stats() if self.embedder else {},
+        }
+
+    async def encode(self, texts: list[str], **kwargs) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((texts, kwargs, future))
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self._queue.get()]
+            size = len(requests[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                requests.append(request)
+                size += len(request[0])
+
+            groups: dict[str, list[_Request]] = {}
+            for request in requests:
+                options = json.dumps(request[1], sort_keys=True)
+                groups.setdefault(options, []).append(request)
+            for group in groups.values():
+                await self._encode_batch(group)
+
+    async def _encode_batch(self, requests: list[_Request]):
+        """Encode the texts of requests sharing the same options in one call."""
+        texts = [text for request_texts, _, _ in requests for text in request_texts]
+        encode = self.embedder.encode if self.embedder else self.model.encode
+        try:
+            vectors = await asyncio.to_thread(
+                encode, texts, batch_size=self.max_batch_size, **requests[0][1]
+            )
+        except Exception as e:
+            for _, _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.requests += len(requests)
+        self.batches += 1
+        start = 0
+        for request_texts, _, future in requests:
+            end = start + len(request_texts)
+            if not future.done():
+                future.set_result(vectors[start:end])
+            start = end
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = json.loads(await _read_frame(reader))
+                if request["op"] == "info":
+                    writer.write(_frame(json.dumps(self.info()).encode()))
+                elif request["op"] == "encode":
+                    try:
+                        vectors = await self.encode(
+                            request["texts"], **request.get("kwargs", {})
+                        )
+                    except Exception as e:
+                        writer.write(_frame(json.dumps({"error": str(e)}).encode()))
+                    else:
+                        header = {"shape": list(vectors.shape)}
+                        writer.write(_frame(json.dumps(header).encode()))
+                        writer.write(_frame(vectors.tobytes()))
+                else:
+                    error = {"error": f"Unknown op: {request['op']}"}
+                    writer.write(_frame(json.dumps(error).encode()))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: str):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        batcher = asyncio.create_task(self._batch_loop())
+        server = await asyncio.start_unix_server(self._handle, path=socket_path)
+        os.chmod(socket_path, 0o600)
+        print(f"Embedding service for {self.model.model_id} on {socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if self.embedder:
+                self.embedder.flush()
+
+
+class RemoteEmbedModel:
+    """Client side of `EmbeddingService`, usable wherever an `EmbedModel` is.
+
+    Each thread keeps its own connection, so the pipeline's worker threads
+    send their requests concurrently and the service batches them together.
+    `close` closes the connections of every thread. The tokenizer (needed for
+    chunking) is loaded locally on first use.
+
+    The service caches the embeddings, `stats` reports its cache and `flush`
+    has nothing to do, so this stands in for an `EmbeddingCache` as well.
+    """
+
+    def __init__(self, socket_path: str) -> None:
+        self.socket_path = socket_path
+        self._local = threading.local()
+        self._connections: set[socket.socket] = set()
+        self._connections_lock = threading.Lock()
+        self._tokenizer = None
+        info = self._request({"op": "info"})
+        self.model_name: str = info["model_name"]
+        self.model_id: str = info["model_id"]
+        self.max_seq_length: int = info["max_seq_length"]
+        self._dim: int = info["dim"]
+
+    def _connection(self) -> socket.socket:
+        connection = getattr(self._local, "connection", None)
+        # Closed by `close`, possibly from another thread
+        if connection is None or connection.fileno() == -1:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                connection.connect(self.socket_path)
+            except OSError:
+                connection.close()
+                raise
+            with self._connections_lock:
+                self._connections.add(connection)
+            self._local.connection = connection
+        return connection
+
+    def _drop_connection(self, connection: socket.socket):
+        connection.close()
+        with self._connections_lock:
+            self._connections.discard(connection)
+        self._local.connection = None
+
+    def close(self) -> None:
+        """Close the connection of every thread, a later request reconnects."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, set()
+        for connection in connections:
+            connection.close()
+
+    def _read_frame(self, connection: socket.socket) -> bytes:
+        (size,) = _HEADER.unpack(self._read_exactly(connection, _HEADER.size))
+        return self._read_exactly(connection, size)
+
+    @staticmethod
+    def _read_exactly(connection: socket.socket, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = connection.recv(min(size - len(data), 1 << 20))
+            if not chunk:
+                raise ConnectionError("Embedding service closed the connection")
+            data.extend(chunk)
+        return bytes(data)
+
+    def _request(self, request: dict) -> dict:
+        connection = self._connection()
+        try:
+            connection.sendall(_frame(json.dumps(request).encode()))
+            header = json.loads(self._read_frame(connection))
+            if "error" in header:
+                raise RuntimeError(f"Embedding service error: {header['error']}")
+            if "shape" in header:
+                data = self._read_frame(connection)
+                header["vectors"] = np.frombuffer(data, dtype=np.float32).reshape(
+                    header["shape"]
+                )
+            return header
+        except (OSError, ValueError):
+            # Leave no half-read reply behind for the next request
+            self._drop_connection(connection)
+            raise
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        return self._tokenizer
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dim
+
+    def encode(self, sentences: str | list[str], batch_size: int = 32, **kwargs):
+        """Encode on the service with the given `encode` options.
+        `batch_size` is ignored, the service batches."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, self._dim), dtype=np.float32)
+        request = {"op": "encode", "texts": texts, "kwargs": kwargs}
+        vectors = self._request(request)["vectors"]
+        return vectors[0] if single else vectors
+
+    def stats(self) -> dict:
+        """Stats of the service's embedding cache."""
+        return self._request({"op": "info"})["cache"]
+
+    def flush(self) -> None:
+        """Nothing to do, the service flushes its cache itself."""
+
+    def similarity(self, embeddings1, embeddings2) -> np.ndarray:
+        a = np.atleast_2d(np.asarray(embeddings1, dtype=np.float32))
+        b = np.atleast_2d(np.asarray(embeddings2, dtype=np.float32))
+        a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+        b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+        return a @ b.T
+
+    def retrieve_similarity_measure(self, text1: str, text2: str) -> float:
+        embedding1 = self.encode(text1)
+        embedding2 = self.encode(text2)
+        return float(self.similarity(embedding1, embedding2)[0, 0])
+
+
+def main():
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from utils.embed_model import EMBED_BACKEND, VI_EMDED_MODEL, EmbedModel
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", default=EMBED_SERVICE_SOCKET)
+    parser.add_argument("--model", default=VI_EMDED_MODEL)
+    parser.add_argument("--backend", default=EMBED_BACKEND)
+    parser.add_argument("--max-batch-size", type=int, default=EMBED_SERVICE_MAX_BATCH)
+    parser.add_argument("--max-wait", type=float, default=EMBED_SERVICE_MAX_WAIT)
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Do not cache the embeddings"
+    )
+    args = parser.parse_args()
+    if not args.socket:
+        parser.error("--socket or EMBED_SERVICE_SOCKET is required")
+
+    model = EmbedModel(args.model, backend=args.backend)
+    service = EmbeddingService(
+        model, args.max_batch_size, args.max_wait, cache=not args.no_cache
+    )
+    asyncio.run(service.serve(args.socket))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,184 @@
+import asyncio
+import os
+import sys
+import weakref
+from urllib.parse import urlsplit
+from urllib.request import url2pathname
+
+import httpx
 import requests
 
+from .html_extract import extract_main_content
+from .page_cache import CachedPage, get_page_cache
 
-def get_html_from_url(url: str) -> str:
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/122.0.0.0 Safari/537.36"
-        )
-    }
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/122.0.0.0 Safari/537.36"
+    )
+}
+
+FETCH_TIMEOUT = 10  # seconds, per request
+FETCH_DEADLINE = 15  # seconds, for a whole batch of urls
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 16
+PER_HOST_LIMIT = 2
+# Statuses telling that a page is gone for good, its cached copy is dropped
+GONE_STATUSES = (404, 410)
+
+_async_client: httpx.AsyncClient | None = None
+# Only the hosts with requests running or waiting, a semaphore goes away with
+# the last request holding it
+_host_semaphores: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = (
+    weakref.WeakValueDictionary()
+)
+# Directory file:// urls may be read from, None rejects every file:// url
+_file_root: str | None = None
+
+
+def allow_file_urls(root: str) -> None:
+    """Let the fetchers read file:// urls of files under `root`.
+
+    Only meant for canned search results (`FileSearchProvider`): urls also
+    come from the LLM and from gateway clients, which must never be able to
+    read arbitrary local files.
+    """
+    global _file_root
+    _file_root = os.path.realpath(root)
 
+
+def _read_file_url(url: str) -> str:
+    """Read a file:// url under `_file_root`, local pages are not cached."""
+    path = os.path.realpath(url2pathname(urlsplit(url).path))
+    if _file_root is None or os.path.commonpath([_file_root, path]) != _file_root:
+        print(f"File url not allowed: {url}", file=sys.stderr)
+        return ""
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.text
-    except requests.RequestException as e:
-        print(f"Request error: {e}")
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except OSError as e:
+        print(f"File error: {e}", file=sys.stderr)
         return ""
 
 
+def get_html_from_url(url: str, use_cache: bool = True) -> str:
+    if url.startswith("file://"):
+        return _read_file_url(url)
+    cache = get_page_cache() if use_cache else None
+    cached = cache.get(url) if cache else None
+    if cached and cached.is_fresh(cache.freshness):  # type: ignore
+        return cached.html
+    headers = {**HEADERS, **cached.validators()} if cached else HEADERS
+    try:
+        response = requests.get(url, headers=headers, timeout=FETCH_TIMEOUT)
+    except requests.RequestException as e:
+        print(f"Request error: {e}", file=sys.stderr)
+        # A stale copy beats no page at all while the server can't be reached
+        return cached.html if cached else ""
+    if cached and response.status_code == 304:
+        cache.touch(url, cached, response.headers)  # type: ignore
+        return cached.html
+    if response.status_code >= 400:
+        print(f"HTTP error {response.status_code} for {url}", file=sys.stderr)
+        if cached and response.status_code in GONE_STATUSES:
+            cache.remove(url)  # type: ignore
+        return _stale_copy(cached, response.status_code)
+    if cache:
+        cache.put(url, response.text, response.headers)
+    return response.text
+
+
+def _stale_copy(cached: CachedPage | None, status: int) -> str:
+    """HTML to return when the server answered `status` >= 400: the stale
+    cached copy for server errors only, a client error means the page
+    itself is no longer served."""
+    return cached.html if cached and status >= 500 else ""
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the shared, pooled async HTTP client (created on first use)."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=FETCH_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+    return _async_client
+
+
+async def close_async_client() -> None:
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc.lower()
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = _host_semaphores[host] = asyncio.Semaphore(PER_HOST_LIMIT)
+    return semaphore
+
+
+async def get_html_from_url_async(
+    url: str, timeout: float = FETCH_TIMEOUT, use_cache: bool = True
+) -> str:
+    """Async counterpart of `get_html_from_url` using the shared client.
+
+    At most `PER_HOST_LIMIT` requests run against the same host at once.
+    """
+    if url.startswith("file://"):
+        return await asyncio.to_thread(_read_file_url, url)
+    cache = get_page_cache() if use_cache else None
+    cached = await asyncio.to_thread(cache.get, url) if cache else None
+    if cached and cached.is_fresh(cache.freshness):  # type: ignore
+        return cached.html
+    headers = cached.validators() if cached else None
+    async with _host_semaphore(url):
+        try:
+            response = await get_async_client().get(
+                url, headers=headers, timeout=timeout
+            )
+        except httpx.HTTPError as e:
+            print(f"Request error: {e}", file=sys.stderr)
+            return cached.html if cached else ""
+    if cached and response.status_code == 304:
+        await asyncio.to_thread(
+            cache.touch, url, cached, response.headers  # type: ignore
+        )
+        return cached.html
+    if response.is_error:
+        print(f"HTTP error {response.status_code} for {url}", file=sys.stderr)
+        if cached and response.status_code in GONE_STATUSES:
+            await asyncio.to_thread(cache.remove, url)  # type: ignore
+        return _stale_copy(cached, response.status_code)
+    if cache:
+        await asyncio.to_thread(cache.put, url, response.text, response.headers)
+    return response.text
+
+
+def get_page_content(url: str, html: str) -> tuple[str | None, str]:
+    """`extract_main_content` for the page fetched from `url`, cached on disk.
+
+    The cached text is dropped whenever the page cache stores new HTML for
+    `url`, so it always matches the HTML last returned by the fetchers.
+    """
+    cache = get_page_cache()
+    if cache and (text := cache.get_text(url)) is not None:
+        return text
+    title, content = extract_main_content(html)
+    if cache and cache.has(url):
+        cache.put_text(url, title, content)
+    return title, content
+
+
 def get_title_n_content_from_html(html_content: str) -> tuple[str | None, str]:
     """
     Extract paragraphs from HTML content.
@@ -0,0 +1,214 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+PAGE_CACHE_DIR = os.getenv(
+    "PAGE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "mcp_hub", "pages"),
+)
+# Seconds a cached page is served without asking the server, after that it is
+# revalidated with a conditional GET. 0 revalidates on every use.
+PAGE_CACHE_FRESHNESS = float(os.getenv("PAGE_CACHE_FRESHNESS", "3600"))
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE", "1") == "1"
+# Size limit of the cache on disk, 0 for no limit. Once it is exceeded the
+# least recently stored pages are removed until the cache is at _PRUNE_TO of it.
+PAGE_CACHE_MAX_MB = float(os.getenv("PAGE_CACHE_MAX_MB", "1024"))
+_PRUNE_TO = 0.8
+
+_page_cache: "PageCache | None" = None
+
+
+@dataclass
+class CachedPage:
+    url: str
+    html: str
+    fetched_at: float
+    etag: str | None = None
+    last_modified: str | None = None
+
+    def is_fresh(self, freshness: float) -> bool:
+        return time.time() - self.fetched_at < freshness
+
+    def validators(self) -> dict[str, str]:
+        """Headers turning a GET for this page into a conditional one."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """On-disk cache of fetched pages and of the text extracted from them.
+
+    Every url gets three files named after its hash: the gzipped HTML, a small
+    JSON file with the fetch time and the ETag/Last-Modified validators, and
+    the gzipped extracted title and content. Storing new HTML drops the
+    extracted text, a 304 response keeps it.
+
+    The bytes written are counted (starting from a scan of the directory on
+    the first write) and when they pass `max_bytes` the pages written least
+    recently are removed. Several processes may share the directory, each one
+    rescans it before pruning.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = PAGE_CACHE_DIR,
+        freshness: float = PAGE_CACHE_FRESHNESS,
+        max_bytes: int = int(PAGE_CACHE_MAX_MB * 2**20),
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.freshness = freshness
+        self.max_bytes = max_bytes
+        self._size: int | None = None
+        self._size_lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url: str, suffix: str) -> str:
+        key = hashlib.sha1(url.encode()).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}{suffix}")
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        if self.max_bytes > 0:
+            self._count(len(data))
+
+    def _count(self, size: int):
+        with self._size_lock:
+            if self._size is None:
+                self._size = sum(entry[1] for entry in self._entries().values())
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._prune()
+
+    def _entries(self) -> dict[str, list]:
+        """[last write time, bytes, paths] of the files of every cached url,
+        by url hash."""
+        entries: dict[str, list] = {}
+        for subdir in os.scandir(self.cache_dir):
+            if not subdir.is_dir():
+                continue
+            for file in os.scandir(subdir.path):
+                if file.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = file.stat()
+                except FileNotFoundError:
+                    continue
+                entry = entries.setdefault(file.name.split(".")[0], [0.0, 0, []])
+                entry[0] = max(entry[0], stat.st_mtime)
+                entry[1] += stat.st_size
+                entry[2].append(file.path)
+        return entries
+
+    def _prune(self):
+        """Remove the pages written least recently until the cache is down to
+        `_PRUNE_TO` of `max_bytes`."""
+        entries = sorted(self._entries().values(), key=lambda entry: entry[0])
+        self._size = sum(entry[1] for entry in entries)
+        for _, size, paths in entries:
+            if self._size <= self.max_bytes * _PRUNE_TO:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._size -= size
+
+    def has(self, url: str) -> bool:
+        """Whether the HTML of `url` is cached, without reading it."""
+        return os.path.exists(self._path(url, ".json")) and os.path.exists(
+            self._path(url, ".html.gz")
+        )
+
+    def get(self, url: str) -> CachedPage | None:
+        try:
+            with open(self._path(url, ".json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            with gzip.open(self._path(url, ".html.gz"), "rt", encoding="utf-8") as f:
+                html = f.read()
+        except (OSError, ValueError):
+            return None
+        return CachedPage(
+            url=url,
+            html=html,
+            fetched_at=meta["fetched_at"],
+            etag=meta.get("etag"),
+            last_modified=meta.get("last_modified"),
+        )
+
+    def put(self, url: str, html: str, headers) -> None:
+        """Store a freshly downloaded page along with the response's validators."""
+        self.remove(url)
+        if "no-store" in headers.get("Cache-Control", "").lower():
+            return
+        self._write(self._path(url, ".html.gz"), gzip.compress(html.encode(), 6))
+        self._write_meta(
+            url, headers.get("ETag"), headers.get("Last-Modified"), time.time()
+        )
+
+    def remove(self, url: str) -> None:
+        for suffix in (".json", ".html.gz", ".text.json.gz"):
+            try:
+                os.remove(self._path(url, suffix))
+            except FileNotFoundError:
+                pass
+
+    def touch(self, url: str, page: CachedPage, headers) -> None:
+        """Mark `page` fresh again after the server answered 304 Not Modified."""
+        self._write_meta(
+            url,
+            headers.get("ETag", page.etag),
+            headers.get("Last-Modified", page.last_modified),
+            time.time(),
+        )
+
+    def _write_meta(
+        self,
+        url: str,
+        etag: str | None,
+        last_modified: str | None,
+        fetched_at: float,
+    ):
+        meta = {
+            "url": url,
+            "fetched_at": fetched_at,
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+        self._write(self._path(url, ".json"), json.dumps(meta).encode())
+
+    def get_text(self, url: str) -> tuple[str | None, str] | None:
+        """Return the cached (title, content) extracted from the page, if any."""
+        try:
+            with gzip.open(self._path(url, ".text.json.gz"), "rb") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return data["title"], data["content"]
+
+    def put_text(self, url: str, title: str | None, content: str) -> None:
+        data = json.dumps({"title": title, "content": content}).encode()
+        self._write(self._path(url, ".text.json.gz"), gzip.compress(data, 6))
+
+
+def get_page_cache() -> PageCache | None:
+    """Return the shared page cache, or None when PAGE_CACHE=0."""
+    global _page_cache
+    if not PAGE_CACHE_ENABLED:
+        return None
+    if _page_cache is None:
+        _page_cache = PageCache()
+    return _page_cache
@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.chunking import iter_token_chunks
+from utils.get_html import get_page_content
+from utils.text_preprocessing import process_text
+
+# Worker processes for HTML extraction, cleaning and chunking. 0 keeps them on
+# threads of the calling process, which is enough for a few small pages but
+# serializes on the GIL.
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", "0"))
+
+# Set by `init_parser`, once per worker process (or once in the parent when
+# parsing on threads)
+_tokenizer = None
+_max_tokens = 0
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def init_parser(tokenizer, max_tokens: int):
+    """Set the tokenizer used by `parse_page`.
+
+    `tokenizer` is either a tokenizer object or the name of a model to load
+    one from, so that worker processes load their own copy once at start-up
+    instead of receiving it with every page.
+    """
+    global _tokenizer, _max_tokens
+    if isinstance(tokenizer, str):
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer)
+    _tokenizer = tokenizer
+    _max_tokens = max_tokens
+
+
+def parse_page(url: str, html: str) -> tuple[str | None, list[str]]:
+    """Extract, clean and chunk one page. Runs in a worker, so it only takes
+    and returns plain strings."""
+    assert _tokenizer is not None, "init_parser must be called first"
+    title, contents = get_page_content(url, html)
+    chunks = (
+        process_text(chunk)
+        for chunk in iter_token_chunks(contents, _tokenizer, _max_tokens)
+    )
+    return title, [chunk for chunk in chunks if chunk]
+
+
+def get_parse_pool(
+    tokenizer_name: str, max_tokens: int, processes: int = PARSE_PROCESSES
+) -> ProcessPoolExecutor:
+    """Return the shared pool of parse workers, started on first use.
+
+    Workers stay alive between queries, so the interpreter start-up and the
+    tokenizer load are only paid once per process.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=processes,
+                # Forking a process that already runs torch threads can deadlock
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_parser,
+                initargs=(tokenizer_name, max_tokens),
+            )
+        return _pool
+
+
+def shutdown_parse_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
@@ -0,0 +1,419 @@
+import asyncio
+import sys
+import time
+from collections import Counter
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import AsyncIterable, Callable, Iterable
+
+import numpy as np
+
+from utils.get_html import FETCH_DEADLINE, get_html_from_url_async
+from utils.vector_backends import VectorBackend
+from utils.vector_store import (
+    EMBED_BATCH_SIZE,
+    SHARED_NAMESPACE,
+    UPSERT_BATCH_SIZE,
+    get_backend,
+    get_embedder,
+    make_points,
+)
+
+FETCH_WORKERS = 8
+PARSE_WORKERS = 4
+QUEUE_SIZE = 64
+# How long the embedder waits for a batch to fill once its first chunk arrived
+BATCH_LINGER = 0.05  # seconds
+
+Item = tuple[str, str | None, str]  # (text, title, source)
+# (url, html) -> (title, chunks), may run in another process
+ParseFunction = Callable[[str, str], tuple[str | None, list[str]]]
+
+_DONE = object()
+
+
+@dataclass
+class StageMetrics:
+    """Where the time of one pipeline stage went, summed over its workers.
+
+    `busy` is time spent working, `starved` time waiting for input and
+    `blocked` time waiting for room in the next stage's queue (backpressure).
+    """
+
+    name: str
+    workers: int
+    items: int = 0
+    busy: float = 0.0
+    starved: float = 0.0
+    blocked: float = 0.0
+
+    def as_dict(self, wall_time: float) -> dict:
+        capacity = wall_time * self.workers
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "items": self.items,
+            "busy": round(self.busy, 3),
+            "starved": round(self.starved, 3),
+            "blocked": round(self.blocked, 3),
+            "utilization": round(self.busy / capacity, 3) if capacity else 0.0,
+        }
+
+
+class IngestionPipeline:
+    """Fetch, parse, embed and store pages as overlapping stages.
+
+    Stages are connected by bounded queues, so a slow stage makes the earlier
+    ones wait instead of piling work up in memory:
+
+    - `fetch_workers` coroutines download pages until `fetch_deadline`,
+    - `parse_workers` workers turn a page into chunks with `parse(url, html)`,
+      on threads or on `parse_executor` (which may be a process pool), and
+      chunks for which `embed_text(text, url)` is None are dropped,
+    - one embedder encodes chunks in batches of up to `embed_batch_size`, a
+      chunk being embedded as the text `embed_text` returned for it (e.g.
+      the text of a chunk it duplicates, so that both share one vector),
+    - one writer upserts `upsert_batch_size` points at a time.
+
+    The network keeps downloading while earlier pages are parsed and encoded.
+
+    With `stop_when`, the writer also upserts as soon as every chunk of a page
+    is buffered, so that a handful of small pages get checked too, and calls
+    `stop_when()` on a thread after every upsert. Once it returns True, pages
+    still being fetched, parsed or embedded are abandoned and `run` returns.
+    The points of pages that were only partly stored are deleted, a shared
+    namespace must never hold a truncated page that later queries would
+    reuse as indexed.
+    """
+
+    def __init__(
+        self,
+        parse: ParseFunction,
+        namespace: str = SHARED_NAMESPACE,
+        backend: VectorBackend | None = None,
+        fetch_workers: int = FETCH_WORKERS,
+        parse_workers: int = PARSE_WORKERS,
+        queue_size: int = QUEUE_SIZE,
+        embed_batch_size: int = EMBED_BATCH_SIZE,
+        upsert_batch_size: int = UPSERT_BATCH_SIZE,
+        fetch_deadline: float = FETCH_DEADLINE,
+        parse_executor: Executor | None = None,
+        embed_text: Callable[[str, str], str | None] | None = None,
+        stop_when: Callable[[], bool] | None = None,
+    ) -> None:
+        self.parse = parse
+        self.embed_text = embed_text
+        self.stop_when = stop_when
+        self.namespace = namespace
+        self.backend = backend
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.fetch_deadline = fetch_deadline
+        self.parse_executor = parse_executor
+        self.metrics: dict[str, StageMetrics] = {}
+        self.ids: list[str] = []
+        self.queued_urls = 0
+        self.fetched_urls = 0
+        self.stopped_early = False
+        self._upstream: list[asyncio.Task] = []
+        # Chunks of every parsed page, and ids of the points stored per page
+        self._page_chunks: dict[str, int] = {}
+        self._page_ids: dict[str, list[str]] = {}
+        # Chunks embedded as another text, see `embed_text`
+        self._embed_as: dict[str, str] = {}
+
+    async def _put(self, queue: asyncio.Queue, item, metrics: StageMetrics):
+        t0 = time.perf_counter()
+        await queue.put(item)
+        metrics.blocked += time.perf_counter() - t0
+
+    async def _get(self, queue: asyncio.Queue, metrics: StageMetrics):
+        t0 = time.perf_counter()
+        item = await queue.get()
+        metrics.starved += time.perf_counter() - t0
+        return item
+
+    async def _feed(
+        self,
+        urls: Iterable[str] | AsyncIterable[str],
+        url_queue: asyncio.Queue,
+        fetch_workers: int,
+    ):
+        seen: set[str] = set()
+
+        async def iterate():
+            if isinstance(urls, AsyncIterable):
+                async for url in urls:
+                    yield url
+            else:
+                for url in urls:
+                    yield url
+
+        async for url in iterate():
+            if url not in seen:
+                seen.add(url)
+                self.queued_urls += 1
+                url_queue.put_nowait(url)
+        for _ in range(fetch_workers):
+            url_queue.put_nowait(_DONE)
+
+    async def _fetch(self, urls: asyncio.Queue, pages: asyncio.Queue, deadline: float):
+        metrics = self.metrics["fetch"]
+        while True:
+            try:
+                url = await asyncio.wait_for(
+                    self._get(urls, metrics), deadline - time.monotonic()
+                )
+            except asyncio.TimeoutError:
+                return
+            if url is _DONE:
+                return
+            t0 = time.perf_counter()
+            try:
+                html = await asyncio.wait_for(
+                    get_html_from_url_async(url), deadline - time.monotonic()
+                )
+            except asyncio.TimeoutError:
+                return
+            finally:
+                metrics.busy += time.perf_counter() - t0
+            self.fetched_urls += 1
+            if html:
+                metrics.items += 1
+                await self._put(pages, (url, html), metrics)
+
+    async def _parse(
+        self, pages: asyncio.Queue, chunks: asyncio.Queue, executor: Executor
+    ):
+        metrics = self.metrics["parse"]
+        loop = asyncio.get_running_loop()
+        while (page := await self._get(pages, metrics)) is not _DONE:
+            url, html = page
+            t0 = time.perf_counter()
+            try:
+                title, texts = await loop.run_in_executor(
+                    executor, self.parse, url, html
+                )
+                if self.embed_text is not None:
+                    kept = []
+                    for text in texts:
+                        embed_as = self.embed_text(text, url)
+                        if embed_as is None:
+                            continue
+                        if embed_as != text:
+                            self._embed_as[text] = embed_as
+                        kept.append(text)
+                    texts = kept
+            except Exception as e:
+                print(f"Error processing {url}: {e}", file=sys.stderr)
+                title, texts = None, []
+            metrics.busy += time.perf_counter() - t0
+            metrics.items += 1
+            self._page_chunks[url] = len(texts)
+            for text in texts:
+                await self._put(chunks, (text, title, url), metrics)
+
+    async def _embed(self, chunks: asyncio.Queue, batches: asyncio.Queue):
+        metrics = self.metrics["embed"]
+        done = False
+        while not done:
+            batch: list[Item] = []
+            item = await self._get(chunks, metrics)
+            if item is _DONE:
+                break
+            batch.append(item)
+            # Linger briefly so that chunks trickling in share one forward pass
+            linger_until = time.monotonic() + BATCH_LINGER
+            while len(batch) < self.embed_batch_size:
+                timeout = linger_until - time.monotonic()
+                try:
+                    item = chunks.get_nowait()
+                except asyncio.QueueEmpty:
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(chunks.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _DONE:
+                    done = True
+                    break
+                batch.append(item)
+
+            t0 = time.perf_counter()
+            texts = [self._embed_as.get(text, text) for text, _, _ in batch]
+            # Chunks sharing a text are encoded once, in this batch or, through
+            # the embedding cache, in an earlier one
+            unique = list(dict.fromkeys(texts))
+            unique_vectors = await asyncio.to_thread(
+                get_embedder().encode, unique, batch_size=self.embed_batch_size
+            )
+            rows = {text: i for i, text in enumerate(unique)}
+            vectors = unique_vectors[[rows[text] for text in texts]]
+            metrics.busy += time.perf_counter() - t0
+            metrics.items += len(batch)
+            await self._put(batches, (batch, vectors), metrics)
+
+    async def _write(self, batches: asyncio.Queue, backend: VectorBackend):
+        metrics = self.metrics["write"]
+        ingested_at = time.time()
+        items: list[Item] = []
+        vectors: list[np.ndarray] = []
+
+        async def flush():
+            t0 = time.perf_counter()
+            ids, payloads = make_points(items, self.namespace, ingested_at)
+            await asyncio.to_thread(
+                backend.upsert, ids, np.concatenate(vectors), payloads
+            )
+            metrics.busy += time.perf_counter() - t0
+            metrics.items += len(ids)
+            self.ids.extend(ids)
+            for point_id, (_, _, source) in zip(ids, items):
+                self._page_ids.setdefault(source, []).append(point_id)
+            items.clear()
+            vectors.clear()
+
+        while (batch := await self._get(batches, metrics)) is not _DONE:
+            items.extend(batch[0])
+            vectors.append(batch[1])
+            if len(items) < self.upsert_batch_size and not (
+                self.stop_when is not None and self._completes_page(items)
+            ):
+                continue
+            await flush()
+            if self.stop_when is not None and await asyncio.to_thread(self.stop_when):
+                self.stopped_early = True
+                for task in self._upstream:
+                    task.cancel()
+                await self._delete_partial_pages(backend)
+                return
+        if items:
+            await flush()
+
+    def _completes_page(self, items: list[Item]) -> bool:
+        """Whether `items` hold the last chunk of a page not stored yet."""
+        buffered = Counter(source for _, _, source in items)
+        return any(
+            len(self._page_ids.get(source, ())) + count == self._page_chunks[source]
+            for source, count in buffered.items()
+        )
+
+    async def _delete_partial_pages(self, backend: VectorBackend):
+        partial = [
+            source
+            for source, ids in self._page_ids.items()
+            if len(ids) < self._page_chunks[source]
+        ]
+        if not partial:
+            return
+        await asyncio.to_thread(
+            backend.delete, namespace=self.namespace, sources=partial
+        )
+        deleted = {
+            point_id for source in partial for point_id in self._page_ids[source]
+        }
+        self.ids = [point_id for point_id in self.ids if point_id not in deleted]
+        print(
+            f"Early exit: deleted {len(partial)} partly stored page(s)",
+            file=sys.stderr,
+        )
+
+    async def run(
+        self, urls: Iterable[str] | AsyncIterable[str]
+    ) -> tuple[list[str], list[dict]]:
+        """Ingest `urls` and return the stored point ids and per-stage metrics.
+
+        `urls` may be an async iterable, e.g. urls streamed from a search
+        provider, in which case fetching starts with the first url.
+        """
+        if isinstance(urls, AsyncIterable):
+            fetch_workers = self.fetch_workers
+        else:
+            urls = list(dict.fromkeys(urls))
+            fetch_workers = max(min(self.fetch_workers, len(urls)), 1)
+        self.ids = []
+        self.queued_urls = 0
+        self.fetched_urls = 0
+        self.stopped_early = False
+        self._page_chunks = {}
+        self._page_ids = {}
+        self._embed_as = {}
+        self.metrics = {
+            "fetch": StageMetrics("fetch", fetch_workers),
+            "parse": StageMetrics("parse", self.parse_workers),
+            "embed": StageMetrics("embed", 1),
+            "write": StageMetrics("write", 1),
+        }
+        url_queue: asyncio.Queue = asyncio.Queue()
+        pages: asyncio.Queue = asyncio.Queue(self.queue_size)
+        chunks: asyncio.Queue = asyncio.Queue(self.queue_size)
+        batches: asyncio.Queue = asyncio.Queue(max(self.queue_size // 8, 2))
+
+        backend = self.backend or await asyncio.to_thread(get_backend)
+        executor = self.parse_executor or ThreadPoolExecutor(
+            self.parse_workers, thread_name_prefix="pipeline-parse"
+        )
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.fetch_deadline
+        feeder = asyncio.create_task(self._feed(urls, url_queue, fetch_workers))
+        fetchers = [
+            asyncio.create_task(self._fetch(url_queue, pages, deadline))
+            for _ in range(fetch_workers)
+        ]
+        parsers = [
+            asyncio.create_task(self._parse(pages, chunks, executor))
+            for _ in range(self.parse_workers)
+        ]
+        embedder = asyncio.create_task(self._embed(chunks, batches))
+        writer = asyncio.create_task(self._write(batches, backend))
+
+        async def close_stages():
+            # Each stage is told to finish once every worker before it is done
+            await asyncio.gather(*fetchers)
+            # Past the fetch deadline no more urls are wanted
+            feeder.cancel()
+            for _ in parsers:
+                await pages.put(_DONE)
+            await asyncio.gather(*parsers)
+            await chunks.put(_DONE)
+            await embedder
+            await batches.put(_DONE)
+            await writer
+
+        closer = asyncio.create_task(close_stages())
+        # Everything the writer cancels when `stop_when` ends ingestion early
+        self._upstream = [feeder, *fetchers, *parsers, embedder, closer]
+        tasks = [feeder, *fetchers, *parsers, embedder, writer, closer]
+        try:
+            # A failing stage would leave the others blocked on its queue
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()  # type: ignore
+        finally:
+            for task in tasks:
+                task.cancel()
+            if self.parse_executor is None:
+                executor.shutdown(wait=False)
+            if self.metrics["embed"].items:
+                await asyncio.to_thread(get_embedder().flush)
+
+        if self.stopped_early:
+            skipped = self.queued_urls - self.metrics["parse"].items
+            print(
+                f"Early exit: {skipped} of {self.queued_urls} queued page(s) "
+                "were never parsed or embedded",
+                file=sys.stderr,
+            )
+        elif dropped := self.queued_urls - self.fetched_urls:
+            print(
+                f"Fetch deadline of {self.fetch_deadline}s reached, "
+                f"{dropped} page(s) dropped",
+                file=sys.stderr,
+            )
+        wall_time = time.perf_counter() - start
+        return self.ids, [m.as_dict(wall_time) for m in self.metrics.values()]
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+import numpy as np
+
+from utils.embed_cache import normalize_text
+
+QUERY_CACHE_TTL = 600  # seconds
+QUERY_CACHE_MAX_ENTRIES = 256
+
+
+def normalize_query(query: str) -> str:
+    return normalize_text(query).lower()
+
+
+class QueryResultCache:
+    """TTL and size bounded cache of search tool results.
+
+    Exact hits match on the normalized query string. When
+    `semantic_threshold` is set and an `embed` function is given, a query
+    whose embedding has at least that cosine similarity with a cached query's
+    embedding is a hit too. `embed` is only called when there is no exact hit.
+    """
+
+    def __init__(
+        self,
+        ttl: float = QUERY_CACHE_TTL,
+        max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+        semantic_threshold: float | None = None,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.semantic_threshold = semantic_threshold
+        # (normalized query, limit) -> (expires at, result, unit query embedding)
+        self._entries: OrderedDict[
+            tuple[str, int], tuple[float, Any, np.ndarray | None]
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _evict_expired(self, now: float):
+        for key in [key for key, entry in self._entries.items() if entry[0] <= now]:
+            del self._entries[key]
+
+    def get(
+        self,
+        query: str,
+        limit: int,
+        embed: Callable[[str], np.ndarray] | None = None,
+    ) -> Any | None:
+        """Return the cached result for `query`, or None on a miss."""
+        key = (normalize_query(query), limit)
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][1]
+            candidates = []
+            if self.semantic_threshold is not None and embed is not None:
+                candidates = [
+                    (cached_key, embedding)
+                    for cached_key, (_, _, embedding) in self._entries.items()
+                    if cached_key[1] == limit and embedding is not None
+                ]
+            if not candidates:
+                self.misses += 1
+                return None
+
+        # Embedding may run the model, other callers must not wait for it
+        matrix = np.stack([embedding for _, embedding in candidates])
+        scores = matrix @ _unit(embed(query))  # type: ignore
+        best = int(np.argmax(scores))
+        cached_key = candidates[best][0]
+        with self._lock:
+            if scores[best] >= self.semantic_threshold and cached_key in self._entries:
+                self._entries.move_to_end(cached_key)
+                self.semantic_hits += 1
+                return self._entries[cached_key][1]
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        query: str,
+        limit: int,
+        result: Any,
+        embed: Callable[[str], np.ndarray] | None = None,
+    ):
+        key = (normalize_query(query), limit)
+        embedding = None
+        if self.semantic_threshold is not None and embed is not None:
+            embedding = _unit(embed(query))
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, result, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+        }
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
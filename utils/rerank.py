@@ -0,0 +1,140 @@
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Small multilingual cross-encoder, Vietnamese included
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_BATCH_SIZE = 16
+# Seconds of cross-encoder inference allowed per query
+RERANK_BUDGET = float(os.getenv("RERANK_BUDGET", "0.5"))
+# Weight of the latest batch in the running estimate of the time per pair
+_ESTIMATE_WEIGHT = 0.3
+
+
+class Reranker:
+    """Rescores search results with a cross-encoder under a time budget.
+
+    The query and every candidate are read together by the model, which
+    ranks far better than the cosine of two separately computed embeddings
+    but costs a forward pass per candidate. Candidates are scored in dense
+    order, in batches of up to `batch_size` sized by the running estimate of
+    the time per pair so that no batch ends past `budget` seconds. Without
+    an estimate yet, a single pair is scored first to get one. The scored
+    candidates are reordered and the ones the budget did not reach follow
+    them in their original order.
+
+    `warm_up` loads the model and seeds the estimate. A query arriving
+    before the model is loaded starts loading it in the background and
+    keeps the original order rather than wait.
+    """
+
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL,
+        batch_size: int = RERANK_BATCH_SIZE,
+        budget: float = RERANK_BUDGET,
+    ) -> None:
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.budget = budget
+        self.seconds_per_pair: float | None = None
+        self._model = None
+        self._lock = threading.Lock()
+        self._loader: threading.Thread | None = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+
+                    self._model = CrossEncoder(self.model_name)
+        return self._model
+
+    def warm_up(self):
+        """Load the model and time a full batch to seed the estimate."""
+        text = "Cá chép là loài cá nước ngọt phổ biến ở Việt Nam. " * 8
+        pairs = [("cá chép", text)] * self.batch_size
+        t0 = time.perf_counter()
+        self.model.predict(
+            pairs, batch_size=self.batch_size, show_progress_bar=False
+        )
+        self._estimate(len(pairs), time.perf_counter() - t0)
+
+    def _load_in_background(self):
+        def load():
+            try:
+                self.warm_up()
+            except Exception as e:
+                print(f"Error loading the rerank model: {e}", file=sys.stderr)
+
+        with self._lock:
+            if self._loader is None:
+                self._loader = threading.Thread(
+                    target=load, name="rerank-warm-up", daemon=True
+                )
+                self._loader.start()
+
+    def _estimate(self, pairs: int, seconds: float):
+        seconds_per_pair = seconds / pairs
+        if self.seconds_per_pair is None:
+            self.seconds_per_pair = seconds_per_pair
+        else:
+            self.seconds_per_pair += _ESTIMATE_WEIGHT * (
+                seconds_per_pair - self.seconds_per_pair
+            )
+
+    def rerank(
+        self,
+        query: str,
+        results: list[dict],
+        limit: int,
+        budget: float | None = None,
+    ) -> list[dict]:
+        """Return the best `limit` of `results`, each with a "rerank_score"
+        (None for the candidates the budget did not reach)."""
+        budget = self.budget if budget is None else budget
+        model = self._model
+        if model is None:
+            self._load_in_background()
+            print(
+                "Rerank model not loaded yet, keeping the original order",
+                file=sys.stderr,
+            )
+            return [{**result, "rerank_score": None} for result in results[:limit]]
+        start = time.perf_counter()
+        scores: list[float] = []
+        while len(scores) < len(results):
+            remaining = budget - (time.perf_counter() - start)
+            if self.seconds_per_pair is None:
+                size = 1
+            else:
+                size = min(self.batch_size, int(remaining / self.seconds_per_pair))
+            if remaining <= 0 or size <= 0:
+                break
+            batch = results[len(scores) : len(scores) + size]
+            t0 = time.perf_counter()
+            batch_scores = model.predict(
+                [(query, result["text"]) for result in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+            )
+            self._estimate(len(batch), time.perf_counter() - t0)
+            scores.extend(float(score) for score in np.atleast_1d(batch_scores))
+
+        if len(scores) < len(results):
+            print(
+                f"Rerank budget of {budget}s reached, "
+                f"{len(scores)}/{len(results)} candidate(s) rescored",
+                file=sys.stderr,
+            )
+        order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        order += range(len(scores), len(results))
+        return [
+            {**results[i], "rerank_score": scores[i] if i < len(scores) else None}
+            for i in order[:limit]
+        ]
@@ -19,17 +19,29 @@ def search_google(
     region: str = "vn",
     start_num: int = 0,
     link_filter_fn: Callable[[str], bool] = default_link_filter_fn,
+    advanced: bool = False,
+    max_pages: int = 3,
 ) -> tuple[list, int]:
-    """Search Google and return the results."""
+    """Search Google and return the results.
+
+    With `advanced`, results carry their title and description (snippet)
+    besides the url. At most `max_pages` pages of `num_results` are requested,
+    fewer results are returned when the filter drops too many of them.
+    """
     results = []
-    while len(results) < num_results:
+    for _ in range(max_pages):
+        if len(results) >= num_results:
+            break
+        page_size = 0
         for result in search(
             query,
             num_results=num_results,
             unique=True,
             region=region,
             start_num=start_num,
+            advanced=advanced,
         ):
+            page_size += 1
             if link_filter_fn is None or link_filter_fn(
                 result if isinstance(result, str) else result.url
             ):
@@ -37,4 +49,6 @@ def search_google(
                     break
                 results.append(result)
         start_num += num_results
+        if page_size == 0:
+            break
     return results, start_num
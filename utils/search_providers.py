@@ -0,0 +1,180 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Callable
+
+from utils.get_html import allow_file_urls
+from utils.search_google import default_link_filter_fn
+
+SEARCH_PAGE_SIZE = 10
+SEARCH_MAX_PAGES = 3
+SEARCH_DEADLINE = 10  # seconds, for all the pages of one query
+# Path of a JSON file of canned results, replaces Google when set
+SEARCH_RESULTS_FILE = os.getenv("SEARCH_RESULTS_FILE")
+
+
+@dataclass
+class SearchHit:
+    url: str
+    title: str | None = None
+    description: str | None = None
+
+
+class SearchProvider(ABC):
+    """Source of web search results, fetched one page at a time.
+
+    `search_pages` bounds the work of a query by `max_pages` and `deadline`,
+    and hands over every page of hits as soon as it arrives so that the
+    caller can start downloading before the last page is in.
+    """
+
+    def __init__(
+        self,
+        page_size: int = SEARCH_PAGE_SIZE,
+        link_filter_fn: Callable[[str], bool] | None = default_link_filter_fn,
+    ) -> None:
+        self.page_size = page_size
+        self.link_filter_fn = link_filter_fn
+
+    @abstractmethod
+    async def fetch_page(self, query: str, page: int) -> list[SearchHit]:
+        """Return the hits of result page `page` (0 based), [] past the end."""
+
+    async def search_pages(
+        self,
+        query: str,
+        max_results: int = SEARCH_PAGE_SIZE,
+        max_pages: int = SEARCH_MAX_PAGES,
+        deadline: float = SEARCH_DEADLINE,
+    ) -> AsyncIterator[list[SearchHit]]:
+        """Yield the new, unfiltered-out hits of every page, in order.
+
+        Stops after `max_results` hits, `max_pages` pages, an empty page or
+        `deadline` seconds, whichever comes first.
+        """
+        end = time.monotonic() + deadline
+        seen: set[str] = set()
+        found = 0
+        for page in range(max_pages):
+            try:
+                hits = await asyncio.wait_for(
+                    self.fetch_page(query, page), end - time.monotonic()
+                )
+            except asyncio.TimeoutError:
+                print(
+                    f"Search deadline of {deadline}s reached after {page} page(s)",
+                    file=sys.stderr,
+                )
+                return
+            except Exception as e:
+                print(f"Search error on page {page}: {e}", file=sys.stderr)
+                return
+            if not hits:
+                return
+            new_hits = []
+            for hit in hits:
+                if not hit.url or hit.url in seen:
+                    continue
+                seen.add(hit.url)
+                if self.link_filter_fn is None or self.link_filter_fn(hit.url):
+                    new_hits.append(hit)
+            new_hits = new_hits[: max_results - found]
+            found += len(new_hits)
+            if new_hits:
+                yield new_hits
+            if found >= max_results:
+                return
+
+    async def search(self, query: str, **kwargs) -> list[SearchHit]:
+        """All the hits of `search_pages` at once."""
+        pages = self.search_pages(query, **kwargs)
+        return [hit async for hits in pages for hit in hits]
+
+
+class GoogleSearchProvider(SearchProvider):
+    def __init__(
+        self,
+        region: str = "vn",
+        page_size: int = SEARCH_PAGE_SIZE,
+        link_filter_fn: Callable[[str], bool] | None = default_link_filter_fn,
+    ) -> None:
+        super().__init__(page_size, link_filter_fn)
+        self.region = region
+
+    async def fetch_page(self, query: str, page: int) -> list[SearchHit]:
+        from googlesearch import search
+
+        def fetch():
+            return [
+                SearchHit(result.url, result.title, result.description)
+                for result in search(
+                    query,
+                    num_results=self.page_size,
+                    unique=True,
+                    region=self.region,
+                    start_num=page * self.page_size,
+                    advanced=True,
+                )
+            ]
+
+        # googlesearch blocks on requests, keep it off the event loop
+        return await asyncio.to_thread(fetch)
+
+
+class FileSearchProvider(SearchProvider):
+    """Serves canned results from a JSON file, for offline runs and benchmarks.
+
+    The file maps queries to lists of {"url", "title", "description"}. The
+    "*" entry answers every other query. Relative file paths in urls
+    (`file://pages/a.html`) are resolved against the file's directory, and
+    the fetchers may only read files under that directory.
+    `delay` simulates the latency of a result page.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        page_size: int = SEARCH_PAGE_SIZE,
+        delay: float = 0.0,
+        link_filter_fn: Callable[[str], bool] | None = None,
+    ) -> None:
+        super().__init__(page_size, link_filter_fn)
+        self.delay = delay
+        base_dir = Path(path).resolve().parent
+        allow_file_urls(str(base_dir))
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.results = {
+            query: [
+                SearchHit(
+                    self._resolve(hit["url"], base_dir),
+                    hit.get("title"),
+                    hit.get("description"),
+                )
+                for hit in hits
+            ]
+            for query, hits in data.items()
+        }
+
+    @staticmethod
+    def _resolve(url: str, base_dir: Path) -> str:
+        if url.startswith("file://") and not url.startswith("file:///"):
+            return (base_dir / url.removeprefix("file://")).as_uri()
+        return url
+
+    async def fetch_page(self, query: str, page: int) -> list[SearchHit]:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        hits = self.results.get(query, self.results.get("*", []))
+        return hits[page * self.page_size : (page + 1) * self.page_size]
+
+
+def get_search_provider() -> SearchProvider:
+    if SEARCH_RESULTS_FILE:
+        return FileSearchProvider(SEARCH_RESULTS_FILE)
+    return GoogleSearchProvider()
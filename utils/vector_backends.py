@@ -0,0 +1,591 @@
+import base64
+import json
+import os
+import sys
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from utils.bm25 import BM25Index
+
+# Points indexed at most by the default `lexical_search`, which scrolls them
+LEXICAL_SCAN_LIMIT = 4096
+# A persisted NumpyBackend rewrites its snapshot once the log of writes since
+# the last one is larger than the snapshot (and than this), so that every row
+# is rewritten a bounded number of times however many writes follow
+SNAPSHOT_MIN_LOG_BYTES = 8 * 2**20
+
+
+class VectorBackend(ABC):
+    """Storage and similarity search for embedded chunks.
+
+    Every filtering method accepts the same optional conditions: a
+    `namespace`, a list of `sources` and bounds on the `ingested_at` payload.
+    """
+
+    def __bool__(self) -> bool:
+        # Callers write `backend or get_backend()`, an empty store must not
+        # fall back to the default one because it defines __len__
+        return True
+
+    @abstractmethod
+    def upsert(self, ids: list[str], vectors: np.ndarray, payloads: list[dict]):
+        """Store one point per row of `vectors`."""
+
+    @abstractmethod
+    def search(
+        self,
+        vector: np.ndarray,
+        limit: int,
+        namespace: str | None = None,
+        sources: list[str] | None = None,
+    ) -> list[dict]:
+        """Return up to `limit` points as {"id", "score", "payload"}, best first."""
+
+    @abstractmethod
+    def delete(
+        self,
+        namespace: str | None = None,
+        ingested_before: float | None = None,
+        sources: list[str] | None = None,
+    ):
+        """Delete the matching points, all of them when no condition is given."""
+
+    @abstractmethod
+    def sources(
+        self,
+        sources: list[str],
+        namespace: str | None = None,
+        ingested_after: float | None = None,
+    ) -> set[str]:
+        """Return the subset of `sources` having at least one matching point."""
+
+    @abstractmethod
+    def scroll(
+        self,
+        namespace: str | None = None,
+        sources: list[str] | None = None,
+        limit: int | None = None,
+    ) -> list[dict]:
+        """Return the matching points as {"id", "payload"}, at most `limit`."""
+
+    def lexical_search(
+        self,
+        query: str,
+        limit: int,
+        namespace: str | None = None,
+        sources: list[str] | None = None,
+    ) -> list[dict]:
+        """Return up to `limit` points ranked by BM25 on their text, best first.
+
+        This indexes up to LEXICAL_SCAN_LIMIT matching points on every call,
+        which is cheap for a per-query corpus. Backends keeping an index up
+        to date override it.
+        """
+        points = self.scroll(
+            namespace=namespace, sources=sources, limit=LEXICAL_SCAN_LIMIT
+        )
+        index = BM25Index()
+        index.add([point["payload"]["text"] for point in points])
+        return [
+            {"id": points[i]["id"], "score": score, "payload": points[i]["payload"]}
+            for i, score in index.search(query, limit)
+        ]
+
+    @abstractmethod
+    def drop(self):
+        """Remove the whole collection."""
+
+    def close(self):
+        """Release the backend's resources, it is not used anymore."""
+
+
+class QdrantBackend(VectorBackend):
+    # qdrant_client takes about a second to import, so it is only imported
+    # when this backend is actually used.
+    def __init__(self, vector_size: int, collection_name: str, client=None) -> None:
+        from qdrant_client import QdrantClient
+        from qdrant_client.http.models import Distance, PayloadSchemaType, VectorParams
+
+        self.client = client or QdrantClient(host="localhost", port=6333)
+        self.collection_name = collection_name
+        try:
+            self.client.get_collection(collection_name=collection_name)
+            print(f"Collection '{collection_name}' already exists", file=sys.stderr)
+        except Exception:
+            self.client.create_collection(
+                collection_name=collection_name,
+                vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+            )
+            print(f"Created collection '{collection_name}'", file=sys.stderr)
+        for field, schema in (
+            ("namespace", PayloadSchemaType.KEYWORD),
+            ("source", PayloadSchemaType.KEYWORD),
+            ("ingested_at", PayloadSchemaType.FLOAT),
+        ):
+            self.client.create_payload_index(
+                collection_name=collection_name, field_name=field, field_schema=schema
+            )
+
+    @staticmethod
+    def build_filter(
+        namespace: str | None = None,
+        sources: list[str] | None = None,
+        ingested_after: float | None = None,
+        ingested_before: float | None = None,
+    ):
+        from qdrant_client.http.models import (
+            FieldCondition,
+            Filter,
+            MatchAny,
+            MatchValue,
+            Range,
+        )
+
+        must = []
+        if namespace is not None:
+            must.append(
+                FieldCondition(key="namespace", match=MatchValue(value=namespace))
+            )
+        if sources is not None:
+            must.append(FieldCondition(key="source", match=MatchAny(any=sources)))
+        if ingested_after is not None or ingested_before is not None:
+            must.append(
+                FieldCondition(
+                    key="ingested_at",
+                    range=Range(gte=ingested_after, lt=ingested_before),
+                )
+            )
+        return Filter(must=must)
+
+    def upsert(self, ids: list[str], vectors: np.ndarray, payloads: list[dict]):
+        from qdrant_client.http.models import PointStruct
+
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[
+                PointStruct(id=point_id, vector=vector.tolist(), payload=payload)
+                for point_id, vector, payload in zip(ids, vectors, payloads)
+            ],
+        )
+
+    def search(
+        self,
+        vector: np.ndarray,
+        limit: int,
+        namespace: str | None = None,
+        sources: list[str] | None = None,
+    ) -> list[dict]:
+        search_results = self.client.search(
+            collection_name=self.collection_name,
+            query_vector=vector.tolist(),
+            query_filter=self.build_filter(namespace=namespace, sources=sources),
+            limit=limit,
+        )
+        return [
+            {"id": result.id, "score": result.score, "payload": result.payload}
+            for result in search_results
+        ]
+
+    def delete(
+        self,
+        namespace: str | None = None,
+        ingested_before: float | None = None,
+        sources: list[str] | None = None,
+    ):
+        from qdrant_client.http.models import FilterSelector
+
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(
+                filter=self.build_filter(
+                    namespace=namespace,
+                    sources=sources,
+                    ingested_before=ingested_before,
+                )
+            ),
+        )
+
+    def sources(
+        self,
+        sources: list[str],
+        namespace: str | None = None,
+        ingested_after: float | None = None,
+    ) -> set[str]:
+        found: set[str] = set()
+        scroll_filter = self.build_filter(
+            namespace=namespace, sources=sources, ingested_after=ingested_after
+        )
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scroll_filter,
+                limit=1024,
+                offset=offset,
+                with_payload=["source"],
+                with_vectors=False,
+            )
+            found.update(point.payload["source"] for point in points)  # type: ignore
+            if offset is None or found.issuperset(sources):
+                return found
+
+    def scroll(
+        self,
+        namespace: str | None = None,
+        sources: list[str] | None = None,
+        limit: int | None = None,
+    ) -> list[dict]:
+        points = []
+        scroll_filter = self.build_filter(namespace=namespace, sources=sources)
+        offset = None
+        while limit is None or len(points) < limit:
+            batch, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scroll_filter,
+                limit=1024 if limit is None else min(1024, limit - len(points)),
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            points.extend({"id": point.id, "payload": point.payload} for point in batch)
+            if offset is None:
+                break
+        return points
+
+    def drop(self):
+        self.client.delete_collection(collection_name=self.collection_name)
+        print(f"Collection '{self.collection_name}' deleted", file=sys.stderr)
+
+    def close(self):
+        self.client.close()
+
+
+class NumpyBackend(VectorBackend):
+    """In-process backend keeping all vectors in one normalized NumPy matrix.
+
+    Cosine scores are a single matrix-vector product and top-k selection uses
+    `argpartition`, which beats a server round-trip for per-query corpora of a
+    few hundred chunks. A BM25 index of the texts is kept in step with the
+    vectors. Rows live in arrays with spare capacity that double when full,
+    so an upsert copies only its own rows.
+
+    With `persist_dir` the store is reloaded on start. Every write is appended
+    to a log, and the whole store is only rewritten as a snapshot once the log
+    outgrows it (see SNAPSHOT_MIN_LOG_BYTES) and on `close`. The snapshot
+    names the log that follows it, so a crash between writing a snapshot and
+    removing the previous log never replays a write twice.
+    """
+
+    def __init__(self, vector_size: int, persist_dir: str | None = None) -> None:
+        self.vector_size = vector_size
+        self.persist_dir = persist_dir
+        self._lock = threading.Lock()
+        self._size = 0
+        self._columns = {
+            "vectors": np.empty((0, vector_size), dtype=np.float32),
+            "namespaces": np.empty(0, dtype=object),
+            "sources": np.empty(0, dtype=object),
+            "ingested_at": np.empty(0, dtype=np.float64),
+        }
+        self._ids: list[str] = []
+        self._payloads: list[dict] = []
+        self._bm25 = BM25Index()
+        # Number of the log following the snapshot, and the sizes of both
+        self._generation = 0
+        self._log_bytes = 0
+        self._snapshot_bytes = 0
+        if persist_dir:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def _vectors(self) -> np.ndarray:
+        return self._columns["vectors"][: self._size]
+
+    @property
+    def _namespaces(self) -> np.ndarray:
+        return self._columns["namespaces"][: self._size]
+
+    @property
+    def _sources(self) -> np.ndarray:
+        return self._columns["sources"][: self._size]
+
+    @property
+    def _ingested_at(self) -> np.ndarray:
+        return self._columns["ingested_at"][: self._size]
+
+    def _append_rows(self, **rows: np.ndarray):
+        size = self._size + len(rows["vectors"])
+        capacity = len(self._columns["vectors"])
+        if size > capacity:
+            capacity = max(size, 2 * capacity, 64)
+            for name, column in self._columns.items():
+                grown = np.empty((capacity, *column.shape[1:]), dtype=column.dtype)
+                grown[: self._size] = column[: self._size]
+                self._columns[name] = grown
+        for name, values in rows.items():
+            self._columns[name][self._size : size] = values
+        self._size = size
+
+    def _keep_rows(self, keep: np.ndarray):
+        kept = int(keep.sum())
+        for column in self._columns.values():
+            column[:kept] = column[: self._size][keep]
+        self._size = kept
+
+    def _mask(
+        self,
+        namespace: str | None = None,
+        sources: list[str] | None = None,
+        ingested_after: float | None = None,
+        ingested_before: float | None = None,
+    ) -> np.ndarray:
+        mask = np.ones(len(self._ids), dtype=bool)
+        if namespace is not None:
+            mask &= self._namespaces == namespace
+        if sources is not None:
+            mask &= np.isin(self._sources, np.array(sources, dtype=object))
+        if ingested_after is not None:
+            mask &= self._ingested_at >= ingested_after
+        if ingested_before is not None:
+            mask &= self._ingested_at < ingested_before
+        return mask
+
+    def upsert(self, ids: list[str], vectors: np.ndarray, payloads: list[dict]):
+        with self._lock:
+            vectors = self._add(ids, vectors, payloads)
+            if self.persist_dir:
+                self._log(
+                    {
+                        "op": "upsert",
+                        "ids": ids,
+                        "payloads": payloads,
+                        "vectors": base64.b64encode(vectors.tobytes()).decode(),
+                    }
+                )
+
+    def _add(
+        self, ids: list[str], vectors: np.ndarray, payloads: list[dict]
+    ) -> np.ndarray:
+        """Append the points and return their normalized vectors."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.vector_size)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+        namespaces = np.array([p.get("namespace") for p in payloads], dtype=object)
+        sources = np.array([p.get("source") for p in payloads], dtype=object)
+        ingested_at = np.array([p.get("ingested_at", 0.0) for p in payloads])
+        self._append_rows(
+            vectors=vectors,
+            namespaces=namespaces,
+            sources=sources,
+            ingested_at=ingested_at,
+        )
+        self._ids.extend(ids)
+        self._payloads.extend(payloads)
+        self._bm25.add([p.get("text", "") for p in payloads])
+        return vectors
+
+    def search(
+        self,
+        vector: np.ndarray,
+        limit: int,
+        namespace: str | None = None,
+        sources: list[str] | None = None,
+    ) -> list[dict]:
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        with self._lock:
+            mask = self._mask(namespace=namespace, sources=sources)
+            candidates = np.flatnonzero(mask)
+            if limit <= 0 or not len(candidates):
+                return []
+            scores = self._vectors[candidates] @ query
+            if limit < len(scores):
+                top = np.argpartition(-scores, limit - 1)[:limit]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            return [
+                {
+                    "id": self._ids[candidates[i]],
+                    "score": float(scores[i]),
+                    "payload": self._payloads[candidates[i]],
+                }
+                for i in top
+            ]
+
+    def delete(
+        self,
+        namespace: str | None = None,
+        ingested_before: float | None = None,
+        sources: list[str] | None = None,
+    ):
+        with self._lock:
+            if self._delete(namespace, ingested_before, sources) and self.persist_dir:
+                self._log(
+                    {
+                        "op": "delete",
+                        "namespace": namespace,
+                        "ingested_before": ingested_before,
+                        "sources": sources,
+                    }
+                )
+
+    def _delete(
+        self,
+        namespace: str | None = None,
+        ingested_before: float | None = None,
+        sources: list[str] | None = None,
+    ) -> bool:
+        keep = ~self._mask(
+            namespace=namespace, sources=sources, ingested_before=ingested_before
+        )
+        if keep.all():
+            return False
+        self._keep_rows(keep)
+        kept = np.flatnonzero(keep)
+        self._ids = [self._ids[i] for i in kept]
+        self._payloads = [self._payloads[i] for i in kept]
+        self._bm25.keep(keep)
+        return True
+
+    def sources(
+        self,
+        sources: list[str],
+        namespace: str | None = None,
+        ingested_after: float | None = None,
+    ) -> set[str]:
+        with self._lock:
+            mask = self._mask(
+                namespace=namespace, sources=sources, ingested_after=ingested_after
+            )
+            return set(self._sources[mask].tolist())
+
+    def scroll(
+        self,
+        namespace: str | None = None,
+        sources: list[str] | None = None,
+        limit: int | None = None,
+    ) -> list[dict]:
+        with self._lock:
+            mask = self._mask(namespace=namespace, sources=sources)
+            return [
+                {"id": self._ids[i], "payload": self._payloads[i]}
+                for i in np.flatnonzero(mask)[:limit]
+            ]
+
+    def lexical_search(
+        self,
+        query: str,
+        limit: int,
+        namespace: str | None = None,
+        sources: list[str] | None = None,
+    ) -> list[dict]:
+        with self._lock:
+            mask = self._mask(namespace=namespace, sources=sources)
+            return [
+                {"id": self._ids[i], "score": score, "payload": self._payloads[i]}
+                for i, score in self._bm25.search(query, limit, mask)
+            ]
+
+    def drop(self):
+        self.delete()
+
+    def close(self):
+        with self._lock:
+            if self.persist_dir and self._log_bytes:
+                self._snapshot()
+
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.persist_dir, "snapshot.npz")  # type: ignore
+
+    def _log_path(self, generation: int) -> str:
+        return os.path.join(self.persist_dir, f"log.{generation}.jsonl")  # type: ignore
+
+    def _log(self, record: dict):
+        """Append one write to the log, snapshotting once the log outgrows it."""
+        line = json.dumps(record) + "\n"
+        with open(self._log_path(self._generation), "a", encoding="utf-8") as f:
+            f.write(line)
+        self._log_bytes += len(line)
+        if self._log_bytes > max(SNAPSHOT_MIN_LOG_BYTES, self._snapshot_bytes):
+            self._snapshot()
+
+    def _snapshot(self):
+        generation = self._generation + 1
+        meta = json.dumps(
+            {"ids": self._ids, "payloads": self._payloads, "log": generation}
+        ).encode()
+        path = self._snapshot_path()
+        # Written aside and swapped in, never left half written
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, vectors=self._vectors, meta=np.frombuffer(meta, np.uint8))
+        os.replace(f"{path}.tmp", path)
+        try:
+            os.remove(self._log_path(self._generation))
+        except FileNotFoundError:
+            pass
+        self._generation = generation
+        self._log_bytes = 0
+        self._snapshot_bytes = os.path.getsize(path)
+
+    def _load(self):
+        os.makedirs(self.persist_dir, exist_ok=True)  # type: ignore
+        path = self._snapshot_path()
+        if os.path.exists(path):
+            with np.load(path) as data:
+                vectors = data["vectors"]
+                meta = json.loads(data["meta"].tobytes())
+            if vectors.shape[1:] != (self.vector_size,):
+                print(
+                    f"Ignoring stored vectors in {self.persist_dir}: "
+                    "dimension mismatch",
+                    file=sys.stderr,
+                )
+                return
+            if not len(vectors) == len(meta["ids"]) == len(meta["payloads"]):
+                print(
+                    f"Ignoring stored vectors in {self.persist_dir}: length mismatch",
+                    file=sys.stderr,
+                )
+                return
+            self._add(meta["ids"], vectors, meta["payloads"])
+            self._generation = meta["log"]
+            self._snapshot_bytes = os.path.getsize(path)
+        self._replay(self._log_path(self._generation))
+
+    def _replay(self, log_path: str):
+        """Apply the writes of the log, cutting off a last one left half
+        written by a crash."""
+        if not os.path.exists(log_path):
+            return
+        good = 0
+        with open(log_path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record["op"] == "upsert":
+                    vectors = np.frombuffer(
+                        base64.b64decode(record["vectors"]), dtype=np.float32
+                    )
+                    self._add(record["ids"], vectors, record["payloads"])
+                else:
+                    self._delete(
+                        record["namespace"],
+                        record["ingested_before"],
+                        record["sources"],
+                    )
+                good += len(line)
+        if good < os.path.getsize(log_path):
+            print(
+                f"Ignoring a partly written entry of {log_path}", file=sys.stderr
+            )
+            with open(log_path, "r+b") as f:
+                f.truncate(good)
+        self._log_bytes = good
@@ -1,113 +1,416 @@
+import os
+import sys
+import threading
+import time
 import uuid
+from typing import TYPE_CHECKING
 
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import (
-    Distance,
-    FieldCondition,
-    Filter,
-    FilterSelector,
-    PointStruct,
-    VectorParams,
-)
+import numpy as np
 
-from utils.embed_model import EmbedModel
+from utils.bm25 import reciprocal_rank_fusion
+from utils.embed_cache import EmbeddingCache
+from utils.embed_service import EMBED_SERVICE_SOCKET, RemoteEmbedModel
+from utils.rerank import Reranker
+from utils.vector_backends import NumpyBackend, QdrantBackend, VectorBackend
 
-embed_model = EmbedModel()
-
-qdrant_client = QdrantClient(host="localhost", port=6333)
+if TYPE_CHECKING:
+    from utils.embed_model import EmbedModel
 
 COLLECTION_NAME = "vector_store"
+EMBED_BATCH_SIZE = 32
+UPSERT_BATCH_SIZE = 256
+# Namespace shared by every request when indexed pages are retained for reuse
+SHARED_NAMESPACE = "shared"
+# "qdrant" (server on localhost:6333) or "numpy" (in-process, no server needed)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+# Directory the numpy backend persists to, kept in memory only when unset
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR")
+# Fuse dense and BM25 rankings in `search_similar_texts`
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+# Each ranking is HYBRID_DEPTH_FACTOR * limit deep before fusion
+HYBRID_DEPTH_FACTOR = 4
+# BM25 score a chunk found lexically only must reach to be fused. One match of
+# a word in half of the chunks scores about 0.7, of a word in one chunk out of
+# twenty about 2.6, so this keeps rare words and names and drops stop words.
+LEXICAL_MIN_SCORE = float(os.getenv("LEXICAL_MIN_SCORE", "1.0"))
+# Rescore the candidates of `search_similar_texts` with a cross-encoder
+RERANK = os.getenv("RERANK", "0") == "1"
+# RERANK_DEPTH_FACTOR * limit candidates are rescored
+RERANK_DEPTH_FACTOR = 4
+
+# The model, the embedding cache and the backend are created on first use so
+# that importing this module (and starting an MCP server) stays cheap.
+_init_lock = threading.RLock()
+_embed_model: "EmbedModel | RemoteEmbedModel | None" = None
+_embedder: "EmbeddingCache | RemoteEmbedModel | None" = None
+_vector_backend: VectorBackend | None = None
+_reranker: Reranker | None = None
+
+
+def get_embed_model() -> "EmbedModel | RemoteEmbedModel":
+    """Return the embedding model, or a client of the shared embedding service
+    when EMBED_SERVICE_SOCKET is set and the service is up."""
+    global _embed_model
+    if _embed_model is None:
+        with _init_lock:
+            if _embed_model is None:
+                if EMBED_SERVICE_SOCKET:
+                    try:
+                        _embed_model = RemoteEmbedModel(EMBED_SERVICE_SOCKET)
+                    except OSError as e:
+                        print(
+                            f"Embedding service unavailable, loading model: {e}",
+                            file=sys.stderr,
+                        )
+                if _embed_model is None:
+                    from utils.embed_model import EmbedModel
+
+                    _embed_model = EmbedModel()
+    return _embed_model
+
+
+def get_embedder() -> "EmbeddingCache | RemoteEmbedModel":
+    """Return the cached embedder, repeated texts are served from disk.
+
+    The embedding service keeps the cache itself, its client is returned as is.
+    """
+    global _embedder
+    if _embedder is None:
+        with _init_lock:
+            if _embedder is None:
+                model = get_embed_model()
+                if isinstance(model, RemoteEmbedModel):
+                    _embedder = model
+                else:
+                    _embedder = EmbeddingCache(model)
+    return _embedder
+
+
+def close_embed_model():
+    """Close the connections to the embedding service, if it is used."""
+    if isinstance(_embed_model, RemoteEmbedModel):
+        _embed_model.close()
+
+
+def get_vector_size() -> int:
+    vector_size = get_embed_model().get_sentence_embedding_dimension()
+    assert isinstance(vector_size, int)
+    return vector_size
+
+
+def create_backend(
+    name: str = VECTOR_BACKEND, collection_name: str = COLLECTION_NAME
+) -> VectorBackend:
+    if name == "qdrant":
+        return QdrantBackend(get_vector_size(), collection_name)
+    if name == "numpy":
+        persist_dir = None
+        if VECTOR_STORE_DIR:
+            persist_dir = os.path.join(VECTOR_STORE_DIR, collection_name)
+        return NumpyBackend(get_vector_size(), persist_dir=persist_dir)
+    raise ValueError(f"Unknown vector backend: {name}")
+
 
-VECTOR_SIZE = embed_model.get_sentence_embedding_dimension()
-assert isinstance(VECTOR_SIZE, int)
-try:
-    qdrant_client.get_collection(collection_name=COLLECTION_NAME)
-    print(f"Collection '{COLLECTION_NAME}' already exists")
-except Exception:
-    qdrant_client.create_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config=VectorParams(size=VECTOR_SIZE, distance=Distance.COSINE),
-    )
-    print(f"Created collection '{COLLECTION_NAME}'")
+def get_backend() -> VectorBackend:
+    global _vector_backend
+    if _vector_backend is None:
+        with _init_lock:
+            if _vector_backend is None:
+                _vector_backend = create_backend()
+    return _vector_backend
+
+
+def close_backend():
+    """Close the vector backend, if it was created."""
+    if _vector_backend is not None:
+        _vector_backend.close()
+
+
+def get_reranker() -> Reranker:
+    global _reranker
+    if _reranker is None:
+        with _init_lock:
+            if _reranker is None:
+                _reranker = Reranker()
+    return _reranker
+
+
+def warm_up(background: bool = True) -> threading.Thread | None:
+    """Load the model and connect the backend ahead of the first request."""
+
+    def _warm_up():
+        t0 = time.perf_counter()
+        try:
+            get_embedder()
+            get_backend()
+            if RERANK:
+                get_reranker().warm_up()
+            print(
+                f"Vector store warmed up in {time.perf_counter() - t0:.2f}s",
+                file=sys.stderr,
+            )
+        except Exception as e:
+            print(f"Error in warm_up: {e}", file=sys.stderr)
+
+    if not background:
+        _warm_up()
+        return None
+    thread = threading.Thread(target=_warm_up, name="vector-store-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def new_namespace() -> str:
+    """Return a fresh namespace isolating the points of a single request."""
+    return uuid.uuid4().hex
+
+
+def make_points(
+    items: list[tuple[str, str | None, str]], namespace: str, ingested_at: float
+) -> tuple[list[str], list[dict]]:
+    """Return new point ids and the payloads for (text, title, source) items."""
+    ids = [str(uuid.uuid4()) for _ in items]
+    payloads = [
+        {
+            "text": text,
+            "title": title,
+            "source": source,
+            "namespace": namespace,
+            "ingested_at": ingested_at,
+        }
+        for text, title, source in items
+    ]
+    return ids, payloads
 
 
 # knowledge base
-def add_text_to_qdrant(
-    text, title, source, client=qdrant_client, collection_name=COLLECTION_NAME
-):
+def add_text_to_qdrant(text, title, source, backend: VectorBackend | None = None):
+    ids, _ = add_texts_to_qdrant([(text, title, source)], backend=backend)
+    return ids[0] if ids else None
+
+
+def add_texts_to_qdrant(
+    items: list[tuple[str, str | None, str]],
+    batch_size: int = EMBED_BATCH_SIZE,
+    upsert_batch_size: int = UPSERT_BATCH_SIZE,
+    namespace: str = SHARED_NAMESPACE,
+    backend: VectorBackend | None = None,
+) -> tuple[list[str], list[dict]]:
+    """Embed and store many (text, title, source) items at once.
+
+    Texts are encoded `batch_size` at a time and written with one upsert per
+    `upsert_batch_size` points instead of one request per chunk. Points are
+    tagged with `namespace` and their ingestion time.
+
+    Returns:
+        tuple: The ids of the stored points and a list of per-batch timings
+        ({"stage", "size", "seconds"}) to help tune the batch sizes.
+    """
+    if not items:
+        return [], []
+    backend = backend or get_backend()
+    timings = []
+    ingested_at = time.time()
+    embedder = get_embedder()
     try:
-        embedding = embed_model.encode(text)
-        point_id = str(uuid.uuid4())
-        client.upsert(
-            collection_name=collection_name,
-            points=[
-                PointStruct(
-                    id=point_id,
-                    vector=embedding.tolist(),
-                    payload={"text": text, "title": title, "source": source},
-                )
-            ],
-        )
-        return point_id
+        embeddings = []
+        for start in range(0, len(items), batch_size):
+            batch = items[start : start + batch_size]
+            t0 = time.perf_counter()
+            embeddings.append(
+                embedder.encode([text for text, _, _ in batch], batch_size=batch_size)
+            )
+            elapsed = time.perf_counter() - t0
+            timings.append({"stage": "encode", "size": len(batch), "seconds": elapsed})
+        vectors = np.concatenate(embeddings)
+        ids, payloads = make_points(items, namespace, ingested_at)
+
+        for start in range(0, len(items), upsert_batch_size):
+            end = start + upsert_batch_size
+            t0 = time.perf_counter()
+            backend.upsert(ids[start:end], vectors[start:end], payloads[start:end])
+            elapsed = time.perf_counter() - t0
+            size = len(ids[start:end])
+            timings.append({"stage": "upsert", "size": size, "seconds": elapsed})
+        embedder.flush()
+        return ids, timings
     except Exception as e:
-        print(f"Error in add_text_to_qdrant: {e}")
-        return None
+        print(f"Error in add_texts_to_qdrant: {e}", file=sys.stderr)
+        return [], timings
 
 
 def search_similar_texts(
     query_text: str,
     limit: int,
-    client=qdrant_client,
-    collection_name=COLLECTION_NAME,
+    backend: VectorBackend | None = None,
     threshold=0.5,
+    namespace: str | None = None,
+    sources: list[str] | None = None,
+    hybrid: bool = HYBRID_SEARCH,
+    rerank: bool = RERANK,
 ):
+    """Return the stored chunks most similar to `query_text`.
+
+    Only points of `namespace` and/or coming from `sources` are considered.
+    A per-request namespace keeps concurrent requests apart. In the shared
+    namespace, requests read every stored chunk of their `sources`, whichever
+    request ingested it.
+
+    "score" is always the cosine similarity of the chunk with the query.
+    With `hybrid`, dense results are fused with BM25 results by reciprocal
+    rank fusion, so chunks sharing rare words with the query rank higher.
+    Chunks found lexically only skip `threshold`, they are the exact names
+    and rare words the embedding misses, but their BM25 score must reach
+    LEXICAL_MIN_SCORE or stop-word overlap would fill the results. The order
+    is then that of "fused_score", the BM25 score being kept as
+    "lexical_score" (None when the chunk was not in the lexical ranking).
+
+    With `rerank`, the best RERANK_DEPTH_FACTOR * limit of these are rescored
+    by a cross-encoder within its time budget (see `Reranker`), the order
+    becoming that of their "rerank_score".
+    """
+    backend = backend or get_backend()
     try:
-        query_embedding = embed_model.encode(query_text)
-        search_results = client.search(
-            collection_name=collection_name,
-            query_vector=query_embedding.tolist(),
-            limit=limit,
+        if rerank:
+            candidates = search_similar_texts(
+                query_text,
+                limit * RERANK_DEPTH_FACTOR,
+                backend,
+                threshold,
+                namespace,
+                sources,
+                hybrid,
+                rerank=False,
+            )
+            try:
+                return get_reranker().rerank(query_text, candidates, limit)
+            except Exception as e:
+                print(
+                    f"Error in rerank, keeping the original order: {e}",
+                    file=sys.stderr,
+                )
+                return candidates[:limit]
+        query_embedding = get_embedder().encode(query_text)
+        depth = limit * HYBRID_DEPTH_FACTOR if hybrid else limit
+        dense = [
+            result
+            for result in backend.search(
+                query_embedding, depth, namespace=namespace, sources=sources
+            )
+            if result["score"] > threshold
+        ]
+        if not hybrid:
+            return [_to_result(result, result["score"]) for result in dense]
+
+        dense_scores = {result["id"]: result["score"] for result in dense}
+        lexical = [
+            result
+            for result in backend.lexical_search(
+                query_text, depth, namespace=namespace, sources=sources
+            )
+            if result["id"] in dense_scores or result["score"] >= LEXICAL_MIN_SCORE
+        ]
+        lexical_only = [
+            result for result in lexical if result["id"] not in dense_scores
+        ]
+        if lexical_only:
+            # Only for their "score", embedded at ingest already and served by
+            # the embedding cache
+            vectors = get_embedder().encode(
+                [result["payload"]["text"] for result in lexical_only]
+            )
+            scores = _unit_rows(vectors) @ _unit_rows(query_embedding)[0]
+            for result, score in zip(lexical_only, scores):
+                dense_scores[result["id"]] = float(score)
+
+        fused = reciprocal_rank_fusion(
+            [[result["id"] for result in dense], [result["id"] for result in lexical]]
         )
+        dense_by_id = {result["id"]: result for result in dense}
+        lexical_by_id = {result["id"]: result for result in lexical}
         results = []
-        for result in search_results:
-            if result.score > threshold:
-                results.append(
-                    {
-                        "text": result.payload["text"],  # type: ignore
-                        "title": result.payload["title"],  # type: ignore
-                        "source": result.payload["source"],  # type: ignore
-                        "score": result.score,
-                        "id": result.id,
-                    }
+        for point_id, fused_score in list(fused.items())[:limit]:
+            result = dense_by_id.get(point_id) or lexical_by_id[point_id]
+            results.append(
+                _to_result(
+                    result,
+                    dense_scores[point_id],
+                    fused_score=fused_score,
+                    lexical_score=lexical_by_id.get(point_id, {}).get("score"),
                 )
+            )
         return results
     except Exception as e:
-        print(f"Error in search_similar_texts: {e}")
+        print(f"Error in search_similar_texts: {e}", file=sys.stderr)
         return []
 
 
-def delete_collection(client=qdrant_client, collection_name=COLLECTION_NAME):
+def _unit_rows(vectors) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _to_result(result: dict, score: float, **scores) -> dict:
+    payload = result["payload"]
+    return {
+        "text": payload["text"],
+        "title": payload["title"],
+        "source": payload["source"],
+        "score": score,
+        "id": result["id"],
+        **scores,
+    }
+
+
+def delete_collection(backend: VectorBackend | None = None):
     try:
-        client.delete_collection(collection_name=collection_name)
-        print(f"Collection '{collection_name}' deleted")
+        (backend or get_backend()).drop()
     except Exception as e:
-        print(f"Error in delete_collection: {e}")
+        print(f"Error in delete_collection: {e}", file=sys.stderr)
 
 
-def delete_data_in_collection(collection_name=COLLECTION_NAME, client=qdrant_client):
+def delete_data_in_collection(backend: VectorBackend | None = None):
     try:
-        client.delete(
-            collection_name=collection_name,
-            points_selector=FilterSelector(
-                filter=Filter(
-                    must=[
-                        FieldCondition(
-                            key="text",
-                        )
-                    ]
-                )
-            ),
+        (backend or get_backend()).delete()
+        print("Data in collection deleted", file=sys.stderr)
+    except Exception as e:
+        print(f"Error in delete_data_in_collection: {e}", file=sys.stderr)
+
+
+def delete_namespace(namespace: str, backend: VectorBackend | None = None):
+    try:
+        (backend or get_backend()).delete(namespace=namespace)
+    except Exception as e:
+        print(f"Error in delete_namespace: {e}", file=sys.stderr)
+
+
+def delete_expired(
+    ttl: float,
+    namespace: str = SHARED_NAMESPACE,
+    backend: VectorBackend | None = None,
+):
+    """Delete the points of `namespace` ingested more than `ttl` seconds ago."""
+    try:
+        (backend or get_backend()).delete(
+            namespace=namespace, ingested_before=time.time() - ttl
+        )
+    except Exception as e:
+        print(f"Error in delete_expired: {e}", file=sys.stderr)
+
+
+def indexed_sources(
+    sources: list[str],
+    ttl: float,
+    namespace: str = SHARED_NAMESPACE,
+    backend: VectorBackend | None = None,
+) -> set[str]:
+    """Return the subset of `sources` indexed in `namespace` within `ttl` seconds."""
+    if not sources:
+        return set()
+    try:
+        return (backend or get_backend()).sources(
+            sources, namespace=namespace, ingested_after=time.time() - ttl
         )
-        print(f"Data in collection '{collection_name}' deleted")
     except Exception as e:
-        print(f"Error in delete_data_in_collection: {e}")
+        print(f"Error in indexed_sources: {e}", file=sys.stderr)
+        return set()